@@ -0,0 +1,255 @@
+#!/usr/bin/python
+"""
+Benchmarks fansub_utils' hasher, checker, cleaner and diff on generated fixture files.
+
+Fixtures are sparse by default (only 4 KiB of every 1 MiB block is written), so multi-GB files
+are created in seconds and don't use up the disk. Each command is ran in-process through the
+fansub_utils Python API on a fresh copy of its fixtures, recording wall time, throughput and peak RSS.
+
+Dependencies:
+    click :   https://click.palletsprojects.com/en/7.x/ OR `pip install click`
+
+    Same as the benchmarked commands (fd, rhash, xdelta3, 7z), commands with missing dependencies are skipped.
+"""
+__author__ = 'Dave <orangechannel@pm.me>'
+__date__ = '3 May 2020'
+
+import json
+import platform
+from contextlib import contextmanager
+from os import chdir, cpu_count, getcwd, rename
+from os.path import join
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter, strftime
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import click
+
+import fansub_utils
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+_BLOCK = fansub_utils._BLOCK_SIZE
+_CHUNK = 4096  # bytes written per block of a sparse fixture
+
+
+def _block_data(seed: int, block: int, size: int) -> bytes:
+    """Deterministic random data for one block, the same seed and block always give the same bytes."""
+    return Random(seed * 1_000_003 + block).getrandbits(size * 8).to_bytes(size, 'little')
+
+
+def _write_fixture(path: str, size: int, seed: int, changes: Sequence[int] = (), insert: int = 0,
+                   dense: bool = False):
+    """Writes a fixture file of `size` bytes (plus `insert`).
+
+    :param changes: block numbers to fill with different data, for v2 files (Default value = ())
+
+    :param insert: bytes inserted in the middle of the file, shifting all later blocks (Default value = 0)
+
+    :param dense: writes every byte instead of leaving holes (Default value = False)
+    """
+    middle = (size // _BLOCK // 2) * _BLOCK
+    with open(path, 'wb') as f:
+        f.truncate(size + insert)
+        for offset in range(0, size, _BLOCK):
+            block = offset // _BLOCK
+            length = min(_BLOCK if dense else _CHUNK, size - offset)
+            f.seek(offset + (insert if offset >= middle else 0))
+            f.write(_block_data(seed + 1 if block in changes else seed, block, length))
+        if insert:
+            f.seek(middle)
+            f.write(_block_data(seed + 2, -1, insert))
+
+
+def _spread(count: int, blocks: int) -> List[int]:
+    """Returns `count` block numbers spread evenly over a file of `blocks` blocks."""
+    return sorted({int((i + 0.5) * blocks / count) for i in range(min(count, blocks))})
+
+
+def _files_fixtures(small: int, small_size: int, large: int, large_size: int, dense: bool, crc: bool) -> Dict[str, int]:
+    """Many small and a few large files for hasher / checker, with their CRC32s in the names if `crc`."""
+    files = {}
+    for prefix, count, size in (('Small', small, small_size), ('Large', large, large_size)):
+        for i in range(1, count + 1):
+            name = f'[Bench] {prefix} - {i:03d} (BD 1080p).mkv'
+            _write_fixture(name, size, i, dense=dense)
+            if crc:
+                hashed = f'{name[:-4]} [{fansub_utils._crc32(name)}].mkv'
+                rename(name, hashed)
+                name = hashed
+            files[name] = size
+
+    return files
+
+
+def _cleaner_fixtures(small: int, small_size: int, dense: bool) -> Dict[str, int]:
+    """Messy names with unique 1-2 digit episode numbers (at most 99 files) for cleaner."""
+    files = {}
+    for i in range(1, min(small, 99) + 1):
+        name = f'bench_trash_ep {i}v2 [Group].mkv'
+        _write_fixture(name, small_size, i, dense=dense)
+        files[name] = small_size
+
+    return files
+
+
+def _pair_fixtures(pairs: int, pair_size: int, changes: int, insert: int, dense: bool) -> Dict[str, int]:
+    """v1/v2 pairs for diff, v2 has `changes` different blocks and `insert` bytes inserted in the middle."""
+    files = {}
+    blocks = -(-pair_size // _BLOCK)
+    for ep in range(1, min(pairs, 99) + 1):
+        v1, v2 = (f'[Bench] Pairs - {ep:02d}{v} (BD 1080p) [{ep:07X}{i}].mkv' for i, v in ((1, ''), (2, 'v2')))
+        _write_fixture(v1, pair_size, ep, dense=dense)
+        _write_fixture(v2, pair_size, ep, _spread(changes, blocks) if changes else (), insert, dense)
+        files[v1], files[v2] = pair_size, pair_size + insert
+
+    return files
+
+
+@contextmanager
+def _fixture_dir(parent: Optional[str]) -> Iterator[str]:
+    """Changes into a new temporary folder, removing it with all fixtures afterwards."""
+    cwd = getcwd()
+    with TemporaryDirectory(prefix='bench_fansub_', dir=parent) as folder:
+        chdir(folder)
+        try: yield folder
+        finally: chdir(cwd)
+
+
+def _reset_peak_rss() -> bool:
+    """Resets the kernel's peak RSS (VmHWM) of this process, only possible on Linux."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss() -> Optional[int]:
+    """Returns the peak RSS of this process in bytes."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try: from resource import RUSAGE_SELF, getrusage
+    except ImportError: return None
+    return getrusage(RUSAGE_SELF).ru_maxrss * (1 if platform.system() == 'Darwin' else 1024)
+
+
+def _run(command: str, call, files: Dict[str, int], read: int) -> dict:
+    """Times `call` in-process with a fresh fansub_utils profile.
+
+    :param read: bytes the command has to read, used for the throughput
+    """
+    fansub_utils._profile = fansub_utils._Profile(enabled=True)
+    reset = _reset_peak_rss()
+
+    start = perf_counter()
+    call()
+    seconds = perf_counter() - start
+
+    return {'command': command, 'files': len(files), 'bytes': read, 'seconds': seconds,
+            'throughput': read / seconds if read and seconds else None, 'files_per_second': len(files) / seconds,
+            'peak_rss': _peak_rss(), 'peak_rss_reset': reset,
+            'stages': fansub_utils._profile.summary()['stages']}
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option('-c', '--command', 'commands', multiple=True, type=click.Choice(['hasher', 'checker', 'cleaner', 'diff']), help='Command to benchmark, can be given more than once. (all by default)')
+@click.option('-r', '--repeat', type=click.IntRange(1), default=3, help='Runs of each command. (3 by default)')
+@click.option('-j', '--jobs', 'jobs_', multiple=True, type=click.IntRange(1), help='Worker counts to try for diff, can be given more than once. (1 and CPU count by default)')
+@click.option('-n', '--small', type=click.IntRange(0), default=200, help='Number of small files. (200 by default)')
+@click.option('--small-size', type=click.IntRange(1), default=1 << 20, metavar='BYTES', help='Size of small files. (1 MiB by default)')
+@click.option('-N', '--large', type=click.IntRange(0), default=2, help='Number of large files. (2 by default)')
+@click.option('--large-size', type=click.IntRange(1), default=4 << 30, metavar='BYTES', help='Size of large files. (4 GiB by default)')
+@click.option('-p', '--pairs', type=click.IntRange(1, 99), default=4, help='Number of v1/v2 pairs for diff. (4 by default)')
+@click.option('--pair-size', type=click.IntRange(1), default=1 << 30, metavar='BYTES', help='Size of v1 files. (1 GiB by default)')
+@click.option('--changes', type=click.IntRange(0), default=8, help='1 MiB blocks changed in v2 files. (8 by default)')
+@click.option('--insert', type=click.IntRange(0), default=0, metavar='BYTES', help='Bytes inserted in the middle of v2 files. (0 by default)')
+@click.option('-D', '--dryrun', is_flag=True, help='Runs diff without creating patches (block comparison only).')
+@click.option('--dense', is_flag=True, help='Writes every byte of the fixtures instead of sparse files (slow).')
+@click.option('--dir', 'parent', type=click.Path(exists=True, file_okay=False), help='Folder to create fixtures in. (system temp folder by default)')
+@click.option('-o', '--output', type=click.Path(dir_okay=False), default='bench_results.jsonl', help='Results file, one JSON object per run is appended. (bench_results.jsonl by default)')
+def bench(commands: tuple, repeat: int, jobs_: tuple, small: int, small_size: int, large: int, large_size: int,
+          pairs: int, pair_size: int, changes: int, insert: int, dryrun: bool, dense: bool, parent: str, output: str):
+    """Benchmarks fansub_utils commands on generated .mkv fixtures.
+
+\b
+hasher / checker: --small files of --small-size and --large files of --large-size
+cleaner:          --small files (at most 99) with messy names
+diff:             --pairs v1/v2 pairs of --pair-size, v2 with --changes different blocks
+                  and --insert bytes inserted in the middle
+
+Every run gets a fresh folder of fixtures, fixture creation isn't timed.
+Results are printed and appended to --output to compare between changes.
+
+\b
+Examples:
+    \b
+    Try 1, 2 and 4 diff workers on 8 pairs of 2 GiB files:
+    $ python bench_fansub.py -c diff -p 8 --pair-size 2147483648 -j 1 -j 2 -j 4
+....
+    Quick run of everything:
+    $ python bench_fansub.py -r 1 --large-size 104857600 --pair-size 104857600
+"""
+    commands = commands or ('hasher', 'checker', 'cleaner', 'diff')
+    jobs_ = jobs_ or sorted({1, cpu_count()})
+    run = {'run': strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'platform': platform.platform(),
+           'cpu_count': cpu_count(), 'dense': dense}
+
+    plans = []
+    for command in commands:
+        for jobs in (jobs_ if command == 'diff' and not dryrun else [None]):
+            plans.append((command, jobs))
+
+    click.secho(f'{"command":<8} {"jobs":>4} {"run":>3} {"files":>6} {"MiB":>10} {"s":>9} {"MiB/s":>10} '
+                f'{"files/s":>9} {"RSS MiB":>8}', bold=True)
+
+    results = []
+    for command, jobs in plans:
+        for i in range(repeat):
+            with _fixture_dir(parent):
+                if command in ('hasher', 'checker'):
+                    files = _files_fixtures(small, small_size, large, large_size, dense, command == 'checker')
+                    read = sum(files.values())
+                    call = getattr(fansub_utils, command)
+                elif command == 'cleaner':
+                    files = _cleaner_fixtures(small, small_size, dense)
+                    read = 0
+                    call = lambda: fansub_utils.cleaner('Bench', 'Cleaned', 'BD', 1080)
+                else:
+                    files = _pair_fixtures(pairs, pair_size, changes, insert, dense)
+                    read = sum(files.values())
+                    call = lambda: fansub_utils.diff(dryrun, jobs=jobs)
+
+                try: result = _run(command, call, files, read)
+                except (OSError, ValueError) as err:
+                    click.secho(f'{command}: skipped, {err}', fg='yellow')
+                    break
+
+            result.update(run, jobs=jobs, repeat=i + 1, params={
+                'small': small, 'small_size': small_size, 'large': large, 'large_size': large_size,
+                'pairs': pairs, 'pair_size': pair_size, 'changes': changes, 'insert': insert, 'dryrun': dryrun})
+            results.append(result)
+
+            throughput = f'{result["throughput"] / (1 << 20):10.1f}' if result['throughput'] else ' ' * 10
+            rss = f'{result["peak_rss"] / (1 << 20):8.1f}' if result['peak_rss'] else ' ' * 8
+            print(f'{command:<8} {jobs or "":>4} {i + 1:>3} {result["files"]:>6} {result["bytes"] / (1 << 20):10.1f} '
+                  f'{result["seconds"]:9.3f} {throughput} {result["files_per_second"]:9.1f} {rss}')
+
+    with open(output, 'a') as results_file:
+        for result in results:
+            results_file.write(json.dumps(result) + '\n')
+
+    if results:
+        print(f'{len(results)} results have been written to {join(getcwd(), output)}.')
+
+
+if __name__ == '__main__':
+    bench()
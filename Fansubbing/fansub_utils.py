@@ -1,7 +1,14 @@
 #!/usr/bin/python
 """
+Every command is also a function that can be imported and called from Python,
+returning its results instead of printing them:
+
+    >>> import fansub_utils
+    >>> fansub_utils.bitrate(950, 'MiB', time=1440)
+    5534
+
 Dependencies:
-    click :   https://click.palletsprojects.com/en/7.x/ OR `pip install click`
+    click :   https://click.palletsprojects.com/en/7.x/ OR `pip install click` (command line only)
 
     fd :      https://www.archlinux.org/packages/community/x86_64/fd/ OR `cargo install fd-find`
     rhash :   https://www.archlinux.org/packages/extra/x86_64/rhash/
@@ -12,28 +19,75 @@ Dependencies:
 __author__ = 'Dave <orangechannel@pm.me>'
 __date__ = '3 May 2020'
 
+import json
 import xml.etree.ElementTree as ET
-from os import mkdir, rename, rmdir
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, redirect_stdout
+from ctypes import CDLL
+from ctypes.util import find_library
+from io import StringIO
+from mmap import ACCESS_READ, mmap
+from os import SEEK_END, close, cpu_count, fstat, listdir, makedirs, mkdir, remove, rename, rmdir
+from os.path import exists, getsize, isfile, join, splitext
 from re import search
+from select import select
 from shutil import copy, move, which
-from subprocess import PIPE, run
-from sys import exit
-from typing import List
-
-import click
+from struct import unpack, unpack_from
+from subprocess import PIPE, Popen, run
+from sys import exit, stderr
+from tempfile import TemporaryFile
+from threading import Lock
+from time import monotonic, perf_counter, sleep
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from zlib import crc32
 
-CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
+class _Profile:
+    """Collects results and per-stage / per-file timings of a command for --json and --profile.
 
-@click.group(context_settings=CONTEXT_SETTINGS)
-def cli():
-    """Fansubbing utility functions. Batch processing functions meant to be ran inside of a folder with .mkv files.
-
-\b
-More information on GitHub:
-https://github.com/OrangeChannel/my-python-scripts/blob/master/Fansubbing
+    Timings are only recorded when `enabled`, so API calls and long running watches don't collect them.
     """
 
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.results = {}
+        self.stages = {}
+        self.files = []
+        self._lock = Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Times a stage (scan, hash, rename, diff, archive, patch), adding up repeated stages."""
+        if not self.enabled:
+            yield
+            return
+        start = perf_counter()
+        try: yield
+        finally: self._add(name, perf_counter() - start, 0)
+
+    def file(self, stage: str, name: str, bytes_: int = 0, seconds: Optional[float] = None):
+        """Records a file processed during `stage`, with the time it took if it was processed on its own."""
+        if not self.enabled: return
+        with self._lock:
+            self.files.append({'stage': stage, 'file': name, 'bytes': bytes_, 'seconds': seconds,
+                               'throughput': bytes_ / seconds if seconds and bytes_ else None})
+        self._add(stage, 0, bytes_)
+
+    def _add(self, stage: str, seconds: float, bytes_: int):
+        with self._lock:
+            totals = self.stages.setdefault(stage, {'seconds': 0.0, 'bytes': 0})
+            totals['seconds'] += seconds
+            totals['bytes'] += bytes_
+
+    def summary(self) -> dict:
+        stages = {name: {**totals, 'throughput': totals['bytes'] / totals['seconds'] if totals['seconds'] and totals['bytes']
+                         else None}
+                  for name, totals in self.stages.items()}
+        return {'stages': stages, 'files': self.files}
+
+
+_profile = _Profile()
+
 
 def _check_dependencies(depends: List[str]):
     paths = {}
@@ -45,316 +99,855 @@ def _check_dependencies(depends: List[str]):
     return paths
 
 
-@cli.command()
-@click.option('-q', '--quiet', is_flag=True, help='Supress output.')
-@click.option('-v', '--verbose', is_flag=True, help='Prints new filenames.')
-def hasher(quiet: bool, verbose: bool):
-    """Appends CRC32 hash to filenames."""
+# Matroska element IDs (with their length marker bits, as they appear in the file)
+_EBML = 0x1A45DFA3
+_SEGMENT = 0x18538067
+_SEEKHEAD, _SEEK, _SEEKID, _SEEKPOSITION = 0x114D9B74, 0x4DBB, 0x53AB, 0x53AC
+_INFO, _TIMESTAMPSCALE, _DURATION = 0x1549A966, 0x2AD7B1, 0x4489
+_TRACKS, _TRACKENTRY, _TRACKNUMBER, _TRACKUID, _TRACKTYPE, _CODECID, _DEFAULTDURATION = \
+    0x1654AE6B, 0xAE, 0xD7, 0x73C5, 0x83, 0x86, 0x23E383
+_CHAPTERS, _EDITIONENTRY, _EDITIONUID = 0x1043A770, 0x45B9, 0x45BC
+_TAGS, _TAG, _TARGETS, _TAGTRACKUID, _SIMPLETAG, _TAGNAME, _TAGSTRING = \
+    0x1254C367, 0x7373, 0x63C0, 0x63C5, 0x67C8, 0x45A3, 0x4487
+_CLUSTER = 0x1F43B675
+
+_TRACK_TYPES = {1: 'video', 2: 'audio', 17: 'subtitles'}
+
+
+def _read_vint(f: BinaryIO, marker: bool = False) -> Optional[int]:
+    """Reads an EBML variable-length integer. Keeps the length marker for element IDs."""
+    if not (first := f.read(1)):
+        raise EOFError
+    length, mask = 1, 0x80
+    while not first[0] & mask:
+        length, mask = length + 1, mask >> 1
+        if length > 8:
+            raise ValueError('invalid EBML variable-length integer')
+
+    value = first[0] if marker else first[0] & (mask - 1)
+    for byte in f.read(length - 1):
+        value = (value << 8) | byte
+
+    # all ones means an unknown size (e.g. live-streamed segments/clusters)
+    if not marker and value == (1 << (7 * length)) - 1:
+        return None
+    return value
+
+
+def _ebml_elements(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[int, Optional[int], int]]:
+    """Yields (id, size, data offset) of the elements between `start` and `end` without reading their data."""
+    pos = start
+    while pos < end:
+        f.seek(pos)
+        try:
+            eid, size = _read_vint(f, marker=True), _read_vint(f)
+        except EOFError:
+            return
+        data = f.tell()
+        yield eid, size, data
+        if size is None:
+            return
+        pos = data + size
+
+
+def _ebml_uint(f: BinaryIO, data: int, size: int) -> int:
+    f.seek(data)
+    return int.from_bytes(f.read(size), 'big')
+
+
+def _ebml_float(f: BinaryIO, data: int, size: int) -> float:
+    f.seek(data)
+    return unpack('>f' if size == 4 else '>d', f.read(size))[0]
+
+
+def _ebml_string(f: BinaryIO, data: int, size: int) -> str:
+    f.seek(data)
+    return f.read(size).rstrip(b'\x00').decode('utf-8', 'replace')
+
+
+def _mkv_info(path: str) -> dict:
+    """Reads duration, track, bitrate and edition metadata from a Matroska file.
+
+Only the EBML header, SeekHead, Info, Tracks, Chapters and Tags elements are read,
+clusters are skipped over by their size so this takes milliseconds regardless of filesize.
+
+Returns a dict with:
+    duration      Duration in seconds (or None).
+    tracks        List of dicts with number, uid, type, codec, default_duration (ns),
+                  bitrate (bps) and frames for each track (None where unknown).
+    edition_uids  EditionUIDs from the chapters.
+    fps, frames   Framerate and frame count of the first video track (or None).
+    """
+    info = {'duration': None, 'tracks': [], 'edition_uids': [], 'fps': None, 'frames': None}
+
+    with open(path, 'rb') as f:
+        end = f.seek(0, SEEK_END)
+
+        elements = _ebml_elements(f, 0, end)
+        if next(elements, (None,))[0] != _EBML:
+            raise ValueError(f'{path} is not a Matroska file')
+        eid, size, seg_start = next(elements, (None, None, None))
+        if eid != _SEGMENT:
+            raise ValueError(f'{path} has no Matroska segment')
+        seg_end = end if size is None else min(seg_start + size, end)
+
+        # find the top-level elements through the SeekHead(s), only walking the segment if there is none
+        positions, seekheads, visited = {}, [], set()
+        pos = seg_start
+        for eid, size, data in _ebml_elements(f, seg_start, seg_end):
+            if eid == _CLUSTER and visited:
+                break
+            if eid == _SEEKHEAD:
+                seekheads.append(pos)
+            elif eid in (_INFO, _TRACKS, _CHAPTERS, _TAGS):
+                positions.setdefault(eid, pos)
+
+            while seekheads:
+                if (head := seekheads.pop()) in visited:
+                    continue
+                visited.add(head)
+                _, head_size, head_data = next(_ebml_elements(f, head, seg_end))
+                for seek, seek_size, seek_data in _ebml_elements(f, head_data, head_data + (head_size or 0)):
+                    if seek != _SEEK:
+                        continue
+                    target_id = target_pos = None
+                    for child, child_size, child_data in _ebml_elements(f, seek_data, seek_data + seek_size):
+                        if child == _SEEKID: target_id = _ebml_uint(f, child_data, child_size)
+                        elif child == _SEEKPOSITION: target_pos = seg_start + _ebml_uint(f, child_data, child_size)
+                    if target_id == _SEEKHEAD and target_pos is not None:
+                        seekheads.append(target_pos)
+                    elif target_id is not None and target_pos is not None:
+                        positions.setdefault(target_id, target_pos)
+
+            if size is None:
+                break
+            pos = data + size
+
+        def _children(eid):
+            if eid not in positions:
+                return []
+            elements = _ebml_elements(f, positions[eid], seg_end)
+            found, size, data = next(elements, (None, None, None))
+            if found != eid or size is None:
+                return []
+            return list(_ebml_elements(f, data, data + size))
+
+        scale, duration = 1000000, None
+        for eid, size, data in _children(_INFO):
+            if eid == _TIMESTAMPSCALE: scale = _ebml_uint(f, data, size)
+            elif eid == _DURATION: duration = _ebml_float(f, data, size)
+        if duration is not None:
+            info['duration'] = duration * scale / 1e9
+
+        uids = {}
+        for eid, size, data in _children(_TRACKS):
+            if eid != _TRACKENTRY:
+                continue
+            track = {'number': None, 'uid': None, 'type': None, 'codec': None, 'default_duration': None,
+                     'bitrate': None, 'frames': None}
+            for child, child_size, child_data in _ebml_elements(f, data, data + size):
+                if child == _TRACKNUMBER: track['number'] = _ebml_uint(f, child_data, child_size)
+                elif child == _TRACKUID: track['uid'] = _ebml_uint(f, child_data, child_size)
+                elif child == _TRACKTYPE: track['type'] = _TRACK_TYPES.get(_ebml_uint(f, child_data, child_size))
+                elif child == _CODECID: track['codec'] = _ebml_string(f, child_data, child_size)
+                elif child == _DEFAULTDURATION: track['default_duration'] = _ebml_uint(f, child_data, child_size)
+            info['tracks'].append(track)
+            uids[track['uid']] = track
+
+        for eid, size, data in _children(_CHAPTERS):
+            if eid != _EDITIONENTRY:
+                continue
+            for child, child_size, child_data in _ebml_elements(f, data, data + size):
+                if child == _EDITIONUID: info['edition_uids'].append(_ebml_uint(f, child_data, child_size))
+
+        # mkvmerge writes per-track statistics tags (BPS, NUMBER_OF_FRAMES)
+        for eid, size, data in _children(_TAGS):
+            if eid != _TAG:
+                continue
+            track, simple_tags = None, {}
+            for child, child_size, child_data in _ebml_elements(f, data, data + size):
+                if child == _TARGETS:
+                    for target, target_size, target_data in _ebml_elements(f, child_data, child_data + child_size):
+                        if target == _TAGTRACKUID: track = uids.get(_ebml_uint(f, target_data, target_size))
+                elif child == _SIMPLETAG:
+                    name = value = None
+                    for tag, tag_size, tag_data in _ebml_elements(f, child_data, child_data + child_size):
+                        if tag == _TAGNAME: name = _ebml_string(f, tag_data, tag_size)
+                        elif tag == _TAGSTRING: value = _ebml_string(f, tag_data, tag_size)
+                    simple_tags[name] = value
+            if track is not None:
+                if (bps := simple_tags.get('BPS', '')).isdigit(): track['bitrate'] = int(bps)
+                if (frames := simple_tags.get('NUMBER_OF_FRAMES', '')).isdigit(): track['frames'] = int(frames)
+
+    for track in info['tracks']:
+        if track['type'] == 'video':
+            if track['default_duration']:
+                info['fps'] = 1e9 / track['default_duration']
+            if track['frames'] is not None:
+                info['frames'] = track['frames']
+            elif info['fps'] and info['duration']:
+                info['frames'] = round(info['duration'] * info['fps'])
+            break
+
+    return info
+
+
+def _input_duration(path: str) -> float:
+    """Returns the duration (in seconds) of an .mkv file for the `input_` parameters."""
+    info = _mkv_info(path)
+
+    if info['duration']:
+        return info['duration']
+    elif info['frames'] and info['fps']:
+        return info['frames'] / info['fps']
+
+    raise ValueError(f'no duration found in {path}')
+
+
+_BLOCK_SIZE = 1 << 20  # 1 MiB blocks for comparing file contents
+_XDELTA_WINDOW = 1 << 26  # xdelta3's default source window (-B) of 64 MiB
+
+
+def _changed_ranges(old: str, new: str, block_size: int = _BLOCK_SIZE) -> List[Tuple[int, int]]:
+    """Compares two files block by block and returns the (start, end) byte ranges of `new` that differ from `old`.
+
+Files of equal size are compared block-aligned, so a changed subtitle line only marks its own block.
+Files of different sizes are compared from both ends, returning the single range between the
+common head and tail, as everything in between has shifted.
+    """
+    with open(old, 'rb') as f_old, open(new, 'rb') as f_new:
+        old_size, new_size = fstat(f_old.fileno()).st_size, fstat(f_new.fileno()).st_size
+        if not old_size or not new_size:
+            return [(0, new_size)] if new_size or old_size else []
+
+        with mmap(f_old.fileno(), 0, access=ACCESS_READ) as a, mmap(f_new.fileno(), 0, access=ACCESS_READ) as b:
+            if old_size == new_size:
+                ranges = []
+                for pos in range(0, new_size, block_size):
+                    if a[pos:pos + block_size] != b[pos:pos + block_size]:
+                        end = min(pos + block_size, new_size)
+                        if ranges and ranges[-1][1] == pos: ranges[-1] = (ranges[-1][0], end)
+                        else: ranges.append((pos, end))
+                return ranges
+
+            common = min(old_size, new_size)
+            head = 0
+            while head < common and a[head:head + block_size] == b[head:head + block_size]:
+                head += block_size
+            tail = 0
+            while tail < common - head:
+                size = min(block_size, common - head - tail)
+                if a[old_size - tail - size:old_size - tail] != b[new_size - tail - size:new_size - tail]:
+                    break
+                tail += size
+
+            return [(min(head, new_size), new_size - tail)]
+
+
+def _patch_strategy(old: str, new: str) -> Tuple[str, int, List[Tuple[int, int]]]:
+    """Picks the cheapest way to turn `old` into `new`.
+
+Returns (strategy, source window size, changed ranges) where strategy is one of:
+    skip    files are identical, the new file only needs to be renamed.
+    window  all changes are close together, xdelta3 can run with a source window just big enough to cover them.
+    xdelta  a regular xdelta3 patch.
+    """
+    ranges = _changed_ranges(old, new)
+    if not ranges:
+        return 'skip', 0, ranges
+
+    # the window has to cover the changed span plus however far the data after it has shifted
+    shift = abs(getsize(new) - getsize(old))
+    span = ranges[-1][1] - ranges[0][0] + shift
+    window = _BLOCK_SIZE
+    while window < 2 * span:
+        window <<= 1
+
+    if window < _XDELTA_WINDOW:
+        return 'window', window, ranges
+    return 'xdelta', _XDELTA_WINDOW, ranges
+
+
+def _crc32_from_name(name: str) -> Optional[str]:
+    """Returns the `[CRC32CRC]` hash embedded in a filename."""
+    if m := search(r'\[(?P<crc>[0-9A-Fa-f]{8})\]', name):
+        return m.group('crc').upper()
+    return None
+
+
+def _episode_versions(names: List[str]) -> Dict[int, Dict[int, str]]:
+    """Groups `[Group] Title - ##v# (...)` filenames by episode number, then by version (1 if not specified)."""
+    episodes = {}
+    for name in names:
+        if m := search(r'- (?P<epnum>\d{2})(?:v(?P<version>\d+))?', name):
+            versions = episodes.setdefault(int(m.group('epnum')), {})
+            version = int(m.group('version') or 1)
+            if version in versions:
+                raise ValueError(f'Episode {m.group("epnum")} version {version} found more than once!')
+            versions[version] = name
+
+    return episodes
+
+
+_MANIFEST = '_patches.json'
+
+
+def _size(name: str) -> Optional[int]:
+    try: return getsize(name)
+    except OSError: return None
+
+
+def _crc32(path: str) -> str:
+    """Streams a file through zlib's CRC32."""
+    crc = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(_BLOCK_SIZE):
+            crc = crc32(chunk, crc)
+
+    return f'{crc:08X}'
+
+
+def _apply_patch(xdelta3: str, source: str, patch: str, target: str) -> Optional[str]:
+    """Patches `source` into `target`, returning an error message if it fails.
+
+The CRC32s in both filenames are verified, the output's while xdelta3 streams it to a temporary file.
+On failure the temporary file is removed and `source` is left untouched, otherwise `source` is moved to 'old'.
+    """
+    started = perf_counter()
+    part = target + '.part'
+    try:
+        if (expected := _crc32_from_name(source)) and (crc := _crc32(source)) != expected:
+            return f'{source}: CRC32 is {crc}, expected {expected}'
+
+        if not patch:
+            rename(source, target)
+            if _profile.enabled: _profile.file('patch', target, _size(target) or 0, perf_counter() - started)
+            return None
+
+        # stderr goes to a file, so a chatty xdelta3 can't block on a full pipe while stdout is read
+        crc = 0
+        with TemporaryFile() as log, open(part, 'wb') as out, \
+                Popen([xdelta3, '-d', '-c', '-s', source, patch], stdout=PIPE, stderr=log) as proc:
+            while chunk := proc.stdout.read(_BLOCK_SIZE):
+                crc = crc32(chunk, crc)
+                out.write(chunk)
+            proc.wait()
+            log.seek(0)
+            err = log.read().decode(errors='replace').strip()
+
+        if proc.returncode:
+            remove(part)
+            return f'{target}: {err}'
+        if (expected := _crc32_from_name(target)) and f'{crc:08X}' != expected:
+            remove(part)
+            return f'{target}: CRC32 is {crc:08X}, expected {expected}'
+
+        rename(part, target)
+        makedirs('old', exist_ok=True)
+        move(source, 'old')
+    except OSError as err:
+        if exists(part): remove(part)
+        return f'{target}: {err}'
+
+    if _profile.enabled:
+        _profile.file('patch', target, (_size(target) or 0) + (_size(join('old', source)) or 0), perf_counter() - started)
+    return None
+
+
+def _clean_name(name: str, group: str, title: str, src: str, res: int) -> Optional[str]:
+    """Returns `[Group] Title - ## (SRC RESp).mkv` from the 1-2 digit episode number in `name`."""
+    if m := search(r'[\s_](?P<num>\d{1,2})\D', name):
+        return f'[{group}] {title} - {int(m.group("num")):02d} ({src.upper()} {res}p).mkv'
+    return None
+
+
+def _embed_crc(name: str) -> str:
+    """Renames a file the same way `rhash --embed-crc` does, returning the new name."""
+    base, ext = splitext(name)
+    new_name = f'{base} [{_crc32(name)}]{ext}'
+    rename(name, new_name)
+
+    return new_name
+
+
+# inotify event masks (see inotify(7))
+_IN_MODIFY, _IN_CLOSE_WRITE, _IN_MOVED_TO, _IN_CREATE = 0x2, 0x8, 0x80, 0x100
+
+
+def _inotify(path: str) -> Optional[BinaryIO]:
+    """Watches `path` for written or moved-in files, returning None where inotify isn't available."""
+    try:
+        libc = CDLL(find_library('c'), use_errno=True)
+        fd = libc.inotify_init()
+    except (OSError, AttributeError, TypeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, path.encode(), _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE) < 0:
+        close(fd)
+        return None
+
+    return open(fd, 'rb', buffering=0)
+
+
+def _inotify_names(events: BinaryIO, timeout: float) -> List[str]:
+    """Waits up to `timeout` seconds for inotify events, returning the filenames they are about."""
+    if not select([events], [], [], timeout)[0]:
+        return []
+
+    names, buf, pos = [], events.read(1 << 16), 0
+    while pos < len(buf):
+        _, _, _, length = unpack_from('iIII', buf, pos)
+        names.append(buf[pos + 16:pos + 16 + length].rstrip(b'\x00').decode(errors='surrogateescape'))
+        pos += 16 + length
+
+    return names
+
+
+def _watch_candidate(name: str) -> bool:
+    return name.endswith('.mkv') and not _crc32_from_name(name) and isfile(name)
+
+
+def hasher() -> dict:
+    """Appends CRC32 hash to filenames with rhash.
+
+    :returns: {'renamed': hashed filenames, 'errors': rhash error lines}
+    """
     paths = _check_dependencies(['fd', 'rhash'])
 
     args = [paths['fd'], '-e', 'mkv', '-X', paths['rhash'], '--embed-crc']
-    proc = run(args, stderr=PIPE, stdout=PIPE, text=True)
-    if err := proc.stderr:
-        for i in err.splitlines(): print(i)
-
-    if not quiet:
-        filenum = 0
-        for i in (lines := proc.stdout.splitlines()):
-            if i[0] != r';': filenum += 1
-        if verbose:
-            print(f'{filenum} files have been renamed:\n')
-            for line in lines:
-                if line[0] != r';': print(line[:-9])
-        else: print(f'{filenum} files have been renamed.')
+    with _profile.stage('hash'):
+        proc = run(args, stderr=PIPE, stdout=PIPE, text=True)
+
+    # rhash prints `name CRC32CRC` for each hashed file
+    renamed = []
+    for line in proc.stdout.splitlines():
+        if line and line[0] != r';':
+            name, base_ext = line[:-9], splitext(line[:-9])
+            renamed.append(name)
+            if _profile.enabled:
+                _profile.file('hash', name, _size(name) or _size(f'{base_ext[0]} [{line[-8:]}]{base_ext[1]}') or 0)
+
+    return {'renamed': renamed, 'errors': proc.stderr.splitlines()}
+
 
+def remover() -> dict:
+    """Removes CRC32 hash from filenames along with any trailing whitespace.
 
-@cli.command()
-@click.option('-q', '--quiet', is_flag=True, help='Supress output.')
-@click.option('-v', '--verbose', is_flag=True, help='Prints new filenames.')
-def remover(quiet: bool, verbose: bool):
-    """Removes CRC32 hash from filenames. Removes whitespace if needed."""
+    :returns: {'renamed': rnr's list of renamed files}
+    """
     paths = _check_dependencies(['fd', 'rnr'])
 
     args = [paths['fd'], '-e', 'mkv', '-X', paths['rnr'], '-f', '--no-dump', r'\s*\[\S{8}\]\s*\.', '.']
-    proc = run(args, stdout=PIPE, text=True)
+    with _profile.stage('rename'):
+        proc = run(args, stdout=PIPE, text=True)
+
+    return {'renamed': proc.stdout.splitlines()}
 
-    if not quiet:
-        filenum = len(proc.stdout.splitlines())
-        if verbose:
-            print(f'{filenum} files have been renamed:\n')
-            print(proc.stdout)
-        else: print(f'{filenum} files have been renamed.')
 
+def checker() -> dict:
+    """Verifies CRC32 hashes in filenames with rhash.
 
-@cli.command()
-def checker():
-    """Verifies CRC32 hashes in filenames."""
+    :returns: {'ok': filenames with matching hashes, 'failed': filenames with mismatching hashes}
+    """
     paths = _check_dependencies(['fd', 'rhash'])
 
-    run([paths['fd'], '-e', 'mkv', '-X', paths['rhash'], '-k'], text=True)
+    with _profile.stage('hash'):
+        proc = run([paths['fd'], '-e', 'mkv', '-X', paths['rhash'], '-k'], stdout=PIPE, text=True)
+
+    ok, failed = [], []
+    for line in proc.stdout.splitlines():
+        if (parts := line.rsplit(None, 1)) and len(parts) == 2 and parts[1] in ('OK', 'ERR'):
+            (ok if parts[1] == 'OK' else failed).append(parts[0])
+            if _profile.enabled: _profile.file('hash', parts[0], _size(parts[0]) or 0)
 
+    return {'ok': ok, 'failed': failed}
 
-@cli.group()
-def renamer():
-    """Batch renames files."""
 
+def simple_renamer(group: str, title: str, src: str, res: int) -> dict:
+    """Renames from `ep##.mkv` to `[Group] Title - ## (SRC RESp).mkv`.
 
-@renamer.command('simple')
-@click.option('-G', '--group', prompt='Group name', metavar=r'"Group"')
-@click.option('-T', '--title', prompt='Show title', metavar=r'"Title"')
-@click.option('-S', '--src', prompt='Source', type=click.Choice(['BD', 'DVD', 'TV', 'WEB'], case_sensitive=False))
-@click.option('-R', '--res', prompt='Resolution <int>', metavar='INT', type=click.IntRange(72, 2160))
-@click.option('-q', '--quiet', is_flag=True, help='Supress output.')
-@click.option('-v', '--verbose', is_flag=True, help='Prints new filenames.')
-def simple_renamer(group: str, title: str, src: str, res: int, quiet: bool, verbose: bool):
-    """Renames from `ep##.mkv` to `[Group] Title - ## (SRC RESp).mkv`."""
+    :returns: {'renamed': rnr's list of renamed files}
+    """
     paths = _check_dependencies(['fd', 'rnr'])
 
     args = [paths['fd'], '-e', 'mkv', '-X', paths['rnr'], '-f', '--no-dump', r'ep(?P<num>\d+)', f'[{group}] {title} - $num ({src.upper()} {res}p)']
-    proc = run(args, stdout=PIPE, text=True)
+    with _profile.stage('rename'):
+        proc = run(args, stdout=PIPE, text=True)
 
-    if not quiet:
-        filenum = len(proc.stdout.splitlines())
-        if verbose:
-            print(f'{filenum} files have been renamed:\n')
-            print(proc.stdout)
-        else:
-            print(f'{filenum} files have been renamed.')
+    return {'renamed': proc.stdout.splitlines()}
 
 
-@renamer.command()
-@click.option('-D', '--dryrun', is_flag=True, help='Prints new filenames without modifying them.')
-@click.option('-G', '--group', prompt='Group name', metavar=r'"Group"')
-@click.option('-T', '--title', prompt='Show title', metavar=r'"Title"')
-@click.option('-S', '--src', prompt='Source', type=click.Choice(['BD', 'DVD', 'TV', 'WEB'], case_sensitive=False))
-@click.option('-R', '--res', prompt='Resolution <int>', metavar='INT', type=click.IntRange(72, 2160))
-def cleaner(dryrun: bool, group: str, title: str, src: str, res: int):
+def cleaner(group: str, title: str, src: str, res: int, dryrun: bool = False) -> dict:
     """Renames files based on unique 1-2 digit number found in original filename.
 
-Will find episode number from a '_#'/' #' or '_##'/' ##' sub-string in filename.
-
-WARNING: if same number is found in multiple filenames,
-files will be overwritten with one file. This is NOT reversible.
+    :param dryrun: only returns the new filenames without modifying them (Default value = False)
 
-Run with `--dryrun` to make sure your files have unique episode numbers.
-
-\b
-Files that are OK:
-    `re:zero 06v3.mkv` --> 06
-    `[Trash] rezero s2 episode 12[ABCD1234].mkv` --> 12
-    `[Trash] Re:Zero2_5.mkv` --> 05
-    `[Garbage *$ s1 ReZERO 1.mkv` --> 01
-
-\b
-Files that are NOT unique:
-    `re:zero season 2 06v3.mkv` --> 02
-    `[Trash] rezero s_2 episode 12[ABCD1234].mkv` --> 02
-    `[Trash] Re:Zero 2_5.mkv` --> 02
-    `[Garbage *$ s1 ReZERO 02.mkv` --> 02
-"""
+    :returns: {'renamed': {old: new}, 'duplicates': {old: new} for new names that were already taken
+               (dryrun only, these are in 'renamed' too), 'errors': {old: error message}}
+    """
     paths = _check_dependencies(['fd'])
 
-    orig_names = run([paths['fd'], '-e', 'mkv'], stdout=PIPE, text=True).stdout.splitlines()
+    with _profile.stage('scan'):
+        orig_names = run([paths['fd'], '-e', 'mkv'], stdout=PIPE, text=True).stdout.splitlines()
     orig_names = [i.rstrip() for i in orig_names]
-    new_names = []
+    renamed, duplicates, errors = {}, {}, {}
 
-    for k, name in enumerate(orig_names):
-        m = search(r'[\s_](?P<num>\d{1,2})\D', name)
-        if m:
+    for name in orig_names:
+        if clean_name := _clean_name(name, group, title, src, res):
             if dryrun:
-                print(f'"{name}"')
-
-                new_name = f'\t--> "[{group}] {title} - {int(m.group("num")):02d} ({src.upper()} {res}p).mkv"'
-                if new_name in new_names:
-                    click.secho(new_name + '\tERR', fg='bright_red', bold=True, blink=True)
-                else:
-                    print(new_name)
-                    new_names.append(new_name)
+                if clean_name in renamed.values():
+                    duplicates[name] = clean_name
+                renamed[name] = clean_name
             else:
-                try: rename(name, f'[{group}] {title} - {int(m.group("num")):02d} ({src.upper()} {res}p).mkv')
+                try:
+                    with _profile.stage('rename'): rename(name, clean_name)
                 except Exception as err:
-                    click.secho(f'ERR: {err}', fg='bright_red')
-
-
-@cli.command()
-@click.option('-D', '--dryrun', is_flag=True, help='Prints detected v2 files without creating patches.')
-@click.option('-W', '--windows', is_flag=True, default=False, help='Creates patch script for Windows users (requires xdelta3.exe in folder).')
-@click.option('-v', '--verbose', is_flag=True, help='Prints all operations\' outputs.')
-def diff(dryrun: bool, windows: bool, verbose: bool):
-    """Creates xdelta3 patches for v2 files.
+                    errors[name] = str(err)
+                else:
+                    renamed[name] = clean_name
 
-Packs patches, a README, and Windows / Linux auto-patch scripts into a .7z archive called "patches.7z".
+    return {'renamed': renamed, 'duplicates': duplicates, 'errors': errors}
 
-If running in --windows mode, you must have an xdelta3.exe binary in the same folder as the .mkv files.
-The exe can be downloaded from here: https://github.com/jmacd/xdelta-gpl/releases and needs to be renamed
-to `xdelta3.exe`.
 
-Should be used on files cleaned/renamed with renamer in the following format:
+def diff(dryrun: bool = False, windows: bool = False, jobs: int = None) -> dict:
+    """Creates xdelta3 patches from every older version of an episode to its latest version.
 
+    Packs patches, a README, a manifest for `apply`, and Windows / Linux auto-patch scripts
+    into a .7z archive called "patches.7z".
 
-    [Group] Title - ## (SRC RESp) [CRC32CRC].mkv
+    :param dryrun: only returns the patches that would be created (Default value = False)
 
-    \b
-i.e.
-[ChannelOrange] Re:Zero Season 5 - 01 (BD 1080p) [468A23FD].mkv
-[ChannelOrange] Re:Zero Season 5 - 02 (BD 1080p) [BACB9212].mkv
-[ChannelOrange] Re:Zero Season 5 - 02v2 (BD 1080p) [E9F7A497].mkv
-[ChannelOrange] Re:Zero Season 5 - 03 (BD 1080p) [FBE791AF].mkv
-[ChannelOrange] Re:Zero Season 5 - 03v2 (BD 1080p) [CEDA7D89].mkv
+    :param windows: creates patch script for Windows users, requires xdelta3.exe in folder (Default value = False)
 
-    Will create patches for episodes 2 and 3 only.
+    :param jobs: number of patches to create at once (Default value = CPU count)
 
-Run with `--dryrun` to see what episode patches will be created.
-"""
+    :returns: {'episodes': {episode: {version: filename}},
+               'patches': [{'episode', 'version', 'source', 'target', 'patch', 'strategy', 'window',
+               'changed_ranges', 'changed_bytes', 'frames': [source frames, target frames]}, ...],
+               'errors': xdelta3 and file error messages, 'archive': 7z's output (not on dryrun)}
+    """
     paths = _check_dependencies(['fd', 'xdelta3', '7z'])
 
-    orig_names = run([paths['fd'], '-e', 'mkv'], stdout=PIPE, text=True).stdout.splitlines()
+    with _profile.stage('scan'):
+        orig_names = run([paths['fd'], '-e', 'mkv'], stdout=PIPE, text=True).stdout.splitlines()
     orig_names = [i.rstrip() for i in orig_names]
 
-    episodes, old_names, new_names = {}, {}, {}
+    episodes = _episode_versions(orig_names)
 
-    for name in orig_names:
-        m = search(r'- (?P<epnum>\d{2})v?(?P<version>\d)?', name)
-        if m:
-            episodes.setdefault(int(m.group('epnum')), []).append(name)
+    # every older version of an episode gets a patch to its latest version, newest first
+    patches = []
+    for num, versions in episodes.items():
+        latest = episodes[num][max(versions)]
+        for version in sorted(versions, reverse=True)[1:]:
+            old = versions[version]
 
-            if verbose:
-                if m.group('version'):
-                    print(f'Episode {m.group("epnum")} version {m.group("version")} detected.')
-
-    for num in episodes:
-        if len(episodes[num]) > 2:
-            raise ValueError(f'Episode {num} has more than 2 versions!')
-        if len(episodes[num]) < 2:
-            episodes[num] = None
-
-    for num in episodes:
-        if episodes[num]:
-            old_names[num] = episodes[num][0]
-            new_names[num] = episodes[num][1]
-
-    if verbose or dryrun:
-        for num in old_names:
-            click.secho(old_names[num], fg='green')
-            click.secho(f'\t--> {new_names[num]}', fg='bright_blue')
-
-    if not dryrun:
-        try: mkdir('patches')
-        except Exception as err:
-            click.secho(f'ERR: {err}', fg='bright_red')
-            exit()
+            # a new version with a different length is usually a mismatched pair rather than a fixed release
+            try: frames = [_mkv_info(old)['frames'], _mkv_info(latest)['frames']]
+            except (OSError, ValueError):
+                frames = [None, None]
 
-        if windows:
-            try: move('xdelta3.exe', 'patches')
-            except Exception as err:
-                click.secho(f'ERR: {err}', fg='bright_red')
-                click.secho('Running with --windows requires an xdelta3.exe file in the folder.', fg='bright_red')
+            started = perf_counter()
+            with _profile.stage('diff'):
+                strategy, window, ranges = _patch_strategy(old, latest)
+            if _profile.enabled:
+                _profile.file('diff', old, (_size(old) or 0) + (_size(latest) or 0), perf_counter() - started)
 
-                try: rmdir('patches')
-                except Exception as err:
-                    click.secho(f'ERR: {err}', fg='bright_red')
-                    exit()
-
-                exit()
+            patches.append({'episode': num, 'version': version, 'source': old, 'target': latest,
+                            'patch': '' if strategy == 'skip' else f'{num:02d}v{version}.vcdiff',
+                            'strategy': strategy, 'window': window, 'changed_ranges': ranges,
+                            'changed_bytes': sum(end - start for start, end in ranges), 'frames': frames})
 
-        try: mkdir('patches/vcdiff')
-        except Exception as err:
-            click.secho(f'ERR: {err}', fg='bright_red')
-            exit()
+    results = {'episodes': episodes, 'patches': patches, 'errors': []}
+    if dryrun:
+        return results
 
-        for num in old_names:
-            run([paths['xdelta3'], '-q', '-e', '-s', old_names[num], new_names[num], f'patches/vcdiff/{num:02d}.vcdiff'])
+    mkdir('patches')
 
-        readme = """Linux:
+    if windows:
+        try: move('xdelta3.exe', 'patches')
+        except OSError:
+            rmdir('patches')
+            raise FileNotFoundError('Running with --windows requires an xdelta3.exe file in the folder.')
+
+    mkdir('patches/vcdiff')
+
+    # xdelta3 is single-threaded, so independent patches are encoded side by side
+    def _encode(patch: dict):
+        started = perf_counter()
+        proc = run([paths['xdelta3'], '-q', '-e', '-B', str(patch['window']), '-s', patch['source'], patch['target'],
+                    f'patches/vcdiff/{patch["patch"]}'], stderr=PIPE, text=True)
+        if _profile.enabled:
+            _profile.file('diff', patch['patch'], (_size(patch['source']) or 0) + (_size(patch['target']) or 0),
+                          perf_counter() - started)
+        return proc
+
+    with _profile.stage('diff'), ThreadPoolExecutor(max_workers=jobs or cpu_count()) as executor:
+        for proc in executor.map(_encode, [i for i in patches if i['patch']]):
+            if proc.returncode:
+                results['errors'].append(proc.stderr.rstrip())
+
+    readme = """Linux:
 1. Extract the patches.7z (containing this file and a vcdiff folder) into your folder containing the original episode .mkv files.
 2. Run _Apply-Patch_unix.sh.
-3. When finished, the new file will appear in this folder and the original will be moved to a folder called 'old'.
-4. You will be prompted to auto-delete the patch files.\n\n"""
+3. When finished, the new file will appear in this folder and the original (any older version) will be moved to a folder called 'old'.
+4. You will be prompted to auto-delete the patch files.
+If rhash is installed, the CRC32 of the original and the patched file are verified.
+
+Python (any OS):
+1. Extract the patches.7z into your folder containing the original episode .mkv files.
+2. Run `python fansub_utils.py apply` to patch all episodes at once with the CRC32 of every file verified.\n\n"""
 
-        if windows:
-            readme += """Windows:
+    if windows:
+        readme += """Windows:
 1. Extract the patches.7z (containing this file and a vcdiff folder) into your folder containing the original episode .mkv files.
 2. Double click the _Apply-Patch_windows.bat file and the patching will start automatically.
-3. When finished, the new file will appear in this folder and the original will be moved to a folder called 'old'.
-4. Delete the vcdiff folder along with this file and the Apply-Patch files."""
+3. When finished, the new file will appear in this folder and the original (any older version) will be moved to a folder called 'old'.
+4. Delete the vcdiff folder along with this file and the Apply-Patch files.
+The CRC32s aren't verified on Windows, use the Python apply above to check them."""
+
+    # the scripts find the file the user has by its CRC32 (or exact name), newest version first
+    linux_patch = """#!/bin/sh
+mkdir -p old
+
+verify() {
+    case "$1" in *\\[????????\\]*) ;; *) return 0 ;; esac
+    command -v rhash >/dev/null 2>&1 || return 0
+    rhash -k "$1" >/dev/null 2>&1 || { echo "CRC32 mismatch: $1"; return 1; }
+}
+
+apply() {
+    for f in "$2" *"[$1]"*.mkv; do
+        [ -e "$f" ] && [ "$f" != "$4" ] || continue
+        verify "$f" || return 1
+        if [ -z "$3" ]; then mv "$f" "$4"
+        elif xdelta3 -v -d -s "$f" "vcdiff/$3" "$4" && verify "$4"; then mv "$f" old
+        else rm -f "$4"; return 1
+        fi
+        return
+    done
+    return 1
+}
+"""
 
-        linux_patch = '` #!/bin/sh`\n` mkdir old`'
+    windows_patch = """@echo off
+mkdir old
+goto :main
+
+:apply
+set "src="
+if exist "%~2" (set "src=%~2") else for %%f in ("*[%~1]*.mkv") do if not "%%f"=="%~4" set "src=%%f"
+if not defined src exit /b 1
+if "%~3"=="" (
+    move "%src%" "%~4" || exit /b 1
+    exit /b 0
+)
+.\\xdelta3.exe -v -d -s "%src%" "vcdiff\\%~3" "%~4"
+if errorlevel 1 (
+    if exist "%~4" del "%~4"
+    exit /b 1
+)
+move "%src%" old
+exit /b 0
+
+:main"""
+
+    manifest, linux_calls, windows_calls = {}, {}, {}
+    for patch in patches:
+        args = f'"{_crc32_from_name(patch["source"]) or "-"}" "{patch["source"]}" "{patch["patch"]}" "{patch["target"]}"'
+        linux_calls.setdefault(patch['episode'], []).append(f'apply {args}')
+        windows_calls.setdefault(patch['episode'], []).append(f'call :apply {args}')
+        manifest.setdefault(f'{patch["episode"]:02d}', []).append(
+            {'source': patch['source'], 'patch': patch['patch'], 'target': patch['target']})
+
+    for num in linux_calls:
+        linux_patch += '\n' + ' || '.join(linux_calls[num])
+        windows_patch += '\n' + '\nif errorlevel 1 '.join(windows_calls[num])
+        windows_patch += '\nif errorlevel 1 set "failed=1"'
+
+    linux_patch += '\n\nrm -i -r vcdiff'
+    linux_patch += f'\nrm -i "_README.txt" "_Apply-Patch_windows.bat" "{_MANIFEST}"'
+    if windows:
+        linux_patch += '\nrm -i "xdelta3.exe"'
+    linux_patch += '\n'
+
+    windows_patch += '\n\nif defined failed (echo Some episodes could not be patched.) else echo Patching complete.'
+    windows_patch += '\n@pause\n'
+
+    readme_file = open('patches/_README.txt', 'w')
+    readme_file.write(readme)
+    readme_file.close()
+
+    with open(f'patches/{_MANIFEST}', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    linux_file = open('patches/_Apply-Patch_unix.sh', 'w')
+    linux_file.write(linux_patch)
+    linux_file.close()
+
+    try: copy(paths['xdelta3'], 'patches')
+    except OSError as err:
+        results['errors'].append(str(err))
+
+    if windows:
+        windows_file = open('patches/_Apply-Patch_windows.bat', 'w')
+        windows_file.write(windows_patch)
+        windows_file.close()
+
+    args = [paths['7z'], 'a', '-t7z', '-m0=lzma', '-mx=9', '-mfb=6', '-md=32m', '-ms=on', 'patches.7z', 'patches']
+    with _profile.stage('archive'):
+        archive_proc = run(args, stdout=PIPE, stderr=PIPE, text=True)
+    if archive_proc.stderr:
+        raise OSError(archive_proc.stderr.rstrip())
+    results['archive'] = archive_proc.stdout
 
-        for num in old_names:
-            linux_patch += f'\n` xdelta3 -v -d -s "{old_names[num]}" "vcdiff/{num:02d}.vcdiff" "{new_names[num]}"`'
-            linux_patch += f'\n` mv "{old_names[num]}" old`'
+    try: rmdir('patches')
+    except OSError as err:
+        results['errors'].append(str(err))
 
-        linux_patch += '\n` rm -i -r vcdiff`'
-        linux_patch += '\n` rm -i "_README.txt" "_Apply-Patch_windows.bat"`'
-        if windows:
-            linux_patch += '\n` rm -i "xdelta3.exe"`\n'
+    return results
 
-        windows_patch = '@echo off\nmkdir old'
 
-        for num in old_names:
-            windows_patch += f'\n.\\xdelta3.exe -v -d -s "{old_names[num]}" "vcdiff/{num:02d}.vcdiff" "{new_names[num]}"`'
-            windows_patch += f'\nmove "{old_names[num]}" old'
+def apply(path: str = '.', jobs: int = None) -> dict:
+    """Applies patches created with diff to the .mkv files in the current folder, verifying CRC32 hashes.
 
-        windows_patch += '\necho Patching complete.'
-        windows_patch += '\n@pause\n'
+    :param path: folder containing the patches (Default value = '.')
 
-        readme_file = open('patches/_README.txt', 'w')
-        readme_file.write(readme)
-        readme_file.close()
+    :param jobs: number of patches to apply at once (Default value = CPU count)
 
-        linux_file = open('patches/_Apply-Patch_unix.sh', 'w')
-        linux_file.write(linux_patch)
-        linux_file.close()
+    :returns: {'patched': {source: target}, 'failed': {source: error message},
+               'missing': episodes without a known version in the folder}
+    """
+    paths = _check_dependencies(['xdelta3'])
+
+    with open(join(path, _MANIFEST)) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    with _profile.stage('scan'):
+        names = listdir('.')
+    tasks, missing = [], []
+    for num, candidates in manifest.items():
+        for entry in candidates:
+            crc = _crc32_from_name(entry['source'])
+            found = [entry['source']] if entry['source'] in names else \
+                [i for i in names if crc and f'[{crc}]' in i and i.endswith('.mkv') and i != entry['target']]
+            if found:
+                patch = join(path, 'vcdiff', entry['patch']) if entry['patch'] else ''
+                tasks.append((found[0], patch, entry['target']))
+                break
+        else:
+            missing.append(num)
 
-        try: copy(paths['xdelta3'], 'patches')
-        except Exception as err:
-            click.secho(f'ERR: {err}', fg='bright_red')
+    patched, failed = {}, {}
+    with _profile.stage('patch'), ThreadPoolExecutor(max_workers=jobs or cpu_count()) as executor:
+        futures = {executor.submit(_apply_patch, paths['xdelta3'], *task): task for task in tasks}
+        for future in as_completed(futures):
+            source, _, target = futures[future]
+            if err := future.result(): failed[source] = err
+            else: patched[source] = target
 
-        if windows:
-            windows_file = open('patches/_Apply-Patch_windows.bat', 'w')
-            windows_file.write(windows_patch)
-            windows_file.close()
+    return {'patched': patched, 'failed': failed, 'missing': missing}
 
-        args = [paths['7z'], 'a', '-t7z', '-m0=lzma', '-mx=9', '-mfb=6', '-md=32m', '-ms=on', 'patches.7z', 'patches']
-        archive_proc = run(args, stdout=PIPE, stderr=PIPE, text=True)
-        if archive_proc.stderr:
-            click.secho('ERR: ' + archive_proc.stderr.rstrip(), fg='bright_red')
-            exit()
-        else:
-            if verbose:
-                print(archive_proc.stdout)
 
-        try:
-            rmdir('patches')
-        except Exception as err:
-            click.secho(f'ERR: {err}', fg='bright_red')
+def watch(group: str = None, title: str = None, src: str = None, res: int = None, settle: float = 10,
+          interval: float = 5, jobs: int = 1, poll: bool = False) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """Watches the current folder and hashes new .mkv files as they are finished.
 
+    Runs until the generator is closed, yielding (filename, new filename, None) for each processed file
+    or (filename, None, error message) if processing it failed.
 
-@cli.command('bitrate')
-@click.option('-S', '--size', type=click.FLOAT, help='Filesize (number only).', prompt=True)
-@click.option('-U', '--unit', type=click.Choice(['TB', 'GB', 'MB', 'kB', 'TiB', 'GiB', 'MiB', 'KiB'], case_sensitive=False), prompt=True)
-@click.option('-T', '--time', type=click.FLOAT, help='Time (in seconds) of clip.', default=0)
-@click.option('-F', '--frames', type=click.INT, help='Number of frames in clip.', default=0)
-@click.option('-R', '--framerate', default=24000/1001, type=click.FLOAT, help='Framerate (in fps) of clip. (23.976 by default)')
-def bitrate_(size: float, unit: str, time: float, frames: int, framerate: float):
+    :param group, title, src, res: renames new files with cleaner if all are given
+
+    :param settle: seconds a file's size must stay the same before it's processed (Default value = 10)
+
+    :param interval: seconds between checks when polling (Default value = 5)
+
+    :param jobs: number of files to hash at once (Default value = 1)
+
+    :param poll: polls the folder instead of using inotify, which is also done when inotify is unavailable
+        (Default value = False)
+    """
+    clean = all(i is not None for i in (group, title, src, res))
+    events = None if poll else _inotify('.')
+
+    def _process(name: str) -> Tuple[str, str]:
+        new_name = name
+        if clean and (clean_name := _clean_name(name, group, title, src, res)) and clean_name != name:
+            if exists(clean_name):
+                raise FileExistsError(f'{clean_name} already exists, not renaming {name}')
+            with _profile.stage('rename'): rename(name, clean_name)
+            new_name = clean_name
+
+        started = perf_counter()
+        with _profile.stage('hash'): hashed_name = _embed_crc(new_name)
+        if _profile.enabled: _profile.file('hash', hashed_name, _size(hashed_name) or 0, perf_counter() - started)
+
+        return name, hashed_name
+
+    pending = {name: (_size(name), monotonic()) for name in listdir('.') if _watch_candidate(name)}
+    in_flight = {}
+    # names a running job renames files to, so they aren't picked up as new files
+    claimed = set()
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while True:
+                if events is None:
+                    sleep(interval)
+                    changed = listdir('.')
+                else:
+                    changed = _inotify_names(events, min(settle, interval))
+
+                now = monotonic()
+                for name in changed:
+                    if name not in pending and name not in claimed and _watch_candidate(name):
+                        pending[name] = (_size(name), now)
+
+                for name, (size, since) in list(pending.items()):
+                    if (current := _size(name)) is None:
+                        del pending[name]
+                    elif current != size:
+                        pending[name] = (current, now)
+                    elif now - since >= settle and len(in_flight) < jobs:
+                        del pending[name]
+                        targets = {name}
+                        if clean and (clean_name := _clean_name(name, group, title, src, res)): targets.add(clean_name)
+                        claimed |= targets
+                        in_flight[executor.submit(_process, name)] = name, targets
+
+                for future in [i for i in in_flight if i.done()]:
+                    name, targets = in_flight.pop(future)
+                    claimed -= targets
+                    try: yield future.result() + (None,)
+                    except OSError as err:
+                        yield name, None, str(err)
+    finally:
+        if events is not None:
+            events.close()
+
+
+def bitrate(size: float, unit: str, time: float = 0, frames: int = 0, framerate: float = 24000/1001,
+            input_: str = None) -> int:
     """Converts a desired filesize into average bitrate in kbps.
 
-If specifying --time, you do not need to specify --frames and vice versa. Units will be prompted for if not specified.
+    :param size: filesize (number only)
+
+    :param unit: filesize unit ('TB', 'GB', 'MB', 'kB', 'TiB', 'GiB', 'MiB', 'KiB')
+
+    :param time: time (in seconds) of clip
+
+    :param frames: number of frames in clip, overrides `time`
+
+    :param framerate: framerate (in fps) of clip (Default value = 23.976)
+
+    :param input_: .mkv file to read the duration from, overrides `time` and `frames`
+
+    :returns: bitrate in kbps
+    """
+    if input_:
+        time, frames = _input_duration(input_), 0
 
-\b
-Examples:
-    \b
-    For a 950 MiB file that is 24 minutes long:
-    $ python fansub_utils.py bitrate -S 950 -U mib -T 1440
-    > Bitrate should be 5,534 kbps.
-....
-    For a 2 GB file that is 34720 frames long:
-    $ python fansub_utils.py bitrate --size 2 -F 34720
-    > Unit (TB, GB, MB, kB, TiB, GiB, MiB, KiB): gb
-    > Bitrate should be 11,049 kbps."""
     if not time and not frames:
-        click.secho('ERR: --time or --frames must be specified.', fg='bright_red')
-        exit()
+        raise ValueError('bitrate: time or frames must be specified')
 
     decimal = {'k': 1000,
                'm': 1000 ** 2,
@@ -376,77 +969,51 @@ Examples:
 
     bits = bytes_ * 8
 
-    rate = round((bits / 1000) / time)
-    print(f'Bitrate should be {rate:,} kbps.')
+    return round((bits / 1000) / time)
 
 
-@cli.command()
-@click.option('-B', '--bitrate', type=click.INT, help='Average bitrate in kbps.', prompt=True)
-@click.option('-T', '--time', type=click.FLOAT, help='Time (in seconds) of clip.', default=0)
-@click.option('-F', '--frames', type=click.INT, help='Number of frames in clip.', default=0)
-@click.option('-R', '--framerate', default=24000/1001, type=click.FLOAT, help='Framerate (in fps) of clip. (23.976 by default)')
-def filesize(bitrate: int, time: float, frames: int, framerate: float):
+def filesize(bitrate: int, time: float = 0, frames: int = 0, framerate: float = 24000/1001, input_: str = None) -> float:
     """Estimates filesize based on average bitrate in kbps.
 
-\b
-Examples:
-    \b
-    At 7,774 kbps for 32,000 frames:
-    $ python fansub_utils.py filesize -B 7774 -F 32000
-    > Estimated filesize is 1.21 GiB or 1.30 GB.
-....
-    At 5,736 kbps for 24 minutes:
-    $ python fansub_utils.py filesize -B 5736 -T 1440
-    > Estimated filesize is 984.65 MiB or 1.03 GB."""
+    :param bitrate: average bitrate in kbps
+
+    :param time: time (in seconds) of clip
+
+    :param frames: number of frames in clip, overrides `time`
+
+    :param framerate: framerate (in fps) of clip (Default value = 23.976)
+
+    :param input_: .mkv file to read the duration from, overrides `time` and `frames`
+
+    :returns: filesize in bytes
+    """
+    if input_:
+        time, frames = _input_duration(input_), 0
+
     if not time and not frames:
-        click.secho('ERR: --time or --frames must be specified.', fg='bright_red')
-        exit()
+        raise ValueError('filesize: time or frames must be specified')
 
     if frames:
         time = (framerate ** -1) * frames
 
     bits = bitrate * 1000 * time
-    bytes_ = bits / 8
-
-    if (bsize := bytes_ / (1 << 40)) >= 1: binary = 'Ti'
-    elif (bsize := bytes_ / (1 << 30)) >= 1: binary = 'Gi'
-    elif (bsize := bytes_ / (1 << 20)) >= 1: binary = 'Mi'
-    elif (bsize := bytes_ / (1 << 10)) >= 1: binary = 'Ki'
-    else:
-        click.secho('ERR: resulting filesize too small', fg='bright_red')
-        exit()
-
-    if (dsize := bytes_ / 1000 ** 4) >= 1: decimal = 'T'
-    elif (dsize := bytes_ / 1000 ** 3) >= 1: decimal = 'G'
-    elif (dsize := bytes_ / 1000 ** 2) >= 1: decimal = 'M'
-    elif (dsize := bytes_ / 1000) >= 1: decimal = 'k'
-    else:
-        click.secho('ERR: resulting filesize too small', fg='bright_red')
-        exit()
+    return bits / 8
 
-    print(f'Estimated filesize is {bsize:.2f} {binary}B or {dsize:.2f} {decimal}B.')
 
+def edition_namer(file: str, editions: Dict[str, str], language: str = 'eng'):
+    """Writes an xml file to name editions in a Mastroka Video file.
 
-@cli.command()
-@click.option('-F', '--file', type=click.STRING, help='Output filename with xml extension.', prompt=True)
-@click.option('-L', '--language', type=click.STRING, help='Language tag for edition names (see ISO-639-2). (eng by default)', default='eng')
-def edition_namer(file: str, language: str):
-    """Outputs an xml file to name editions in a Mastroka Video file.
+    :param file: output filename with xml extension, must not exist yet
 
-Requires the EditionUIDs from a chapter file.
+    :param editions: edition names by EditionUID (see `_mkv_info(path)['edition_uids']`)
 
-In order to properly mux this file into your .mkv file, add this file under 'Global tags' under Output > General in the MKVToolNix GUI or with `--global-tags file-name` via the command line.
+    :param language: language tag for edition names (see ISO-639-2) (Default value = 'eng')
     """
-    editionuids, names = [], []
-    while temp := input(f'Enter edition UID #{len(editionuids) + 1} (press enter if done): '):
-        editionuids.append(temp)
-        names.append(input(f'Enter the edition name for edition {editionuids[-1]}: '))
-
     tags = ET.Element('Tags')
-    for uid, name in zip(editionuids, names):
+    for uid, name in editions.items():
         tag = ET.SubElement(tags, 'Tag')
         target = ET.SubElement(tag, 'Targets')
-        ET.SubElement(target, 'EditionUID').text = uid
+        ET.SubElement(target, 'EditionUID').text = str(uid)
         simple = ET.SubElement(tag, 'Simple')
         ET.SubElement(simple, 'Name').text = 'TITLE'
         ET.SubElement(simple, 'TagLanguage').text = language
@@ -459,5 +1026,441 @@ In order to properly mux this file into your .mkv file, add this file under 'Glo
     file.close()
 
 
+def _print_profile(seconds: float, summary: dict):
+    import click
+
+    def _rate(entry):
+        return f'{entry["throughput"] / (1 << 20):10.1f} MiB/s' if entry['throughput'] else ''
+
+    click.secho(f'\nTotal: {seconds:.3f} s', bold=True)
+    if summary['stages']:
+        click.secho('Stages:', bold=True)
+    for name, entry in summary['stages'].items():
+        print(f'  {name:<8} {entry["seconds"]:9.3f} s {entry["bytes"] / (1 << 20):12.1f} MiB {_rate(entry)}')
+    if summary['files']:
+        click.secho('Files:', bold=True)
+    for entry in summary['files']:
+        timing = f'{entry["seconds"]:9.3f} s' if entry['seconds'] is not None else ' ' * 11
+        print(f'  {entry["stage"]:<8} {timing} {entry["bytes"] / (1 << 20):12.1f} MiB {_rate(entry)}  {entry["file"]}')
+
+
+def _build_cli():
+    """Builds the click command line around the functions above.
+
+    click is only imported here, so importing this file as a module doesn't pay for it.
+    """
+    import click
+
+    CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+    def _fail(err: Exception):
+        click.secho(f'ERR: {err}', fg='bright_red')
+        exit()
+
+    @contextmanager
+    def _prompts(ctx: click.Context):
+        """Shows prompts on stderr while --json collects everything printed to stdout."""
+        if ctx.find_root().params.get('json_'):
+            with redirect_stdout(stderr): yield
+        else: yield
+
+    class _Option(click.Option):
+        def prompt_for_value(self, ctx: click.Context):
+            with _prompts(ctx): return super().prompt_for_value(ctx)
+
+    @click.group(context_settings=CONTEXT_SETTINGS)
+    @click.option('--json', 'json_', is_flag=True, help='Prints results as JSON instead of text.')
+    @click.option('--profile', is_flag=True, help='Prints time spent, bytes read and throughput per stage and file.')
+    @click.pass_context
+    def cli(ctx: click.Context, json_: bool, profile: bool):
+        """Fansubbing utility functions. Batch processing functions meant to be ran inside of a folder with .mkv files.
+
+\b
+More information on GitHub:
+https://github.com/OrangeChannel/my-python-scripts/blob/master/Fansubbing
+    """
+        global _profile
+        _profile = _Profile(enabled=profile)
+        start = perf_counter()
+
+        output = StringIO()
+
+        def _report():
+            if json_:
+                report = {'command': ctx.invoked_subcommand, 'results': _profile.results,
+                          'output': output.getvalue().splitlines()}
+                if profile:
+                    report['profile'] = {'seconds': perf_counter() - start, **_profile.summary()}
+                print(json.dumps(report, indent=2))
+            elif profile:
+                _print_profile(perf_counter() - start, _profile.summary())
+
+        ctx.call_on_close(_report)
+
+        # text output is kept in the JSON instead of being printed,
+        # entered after registering _report so it's undone before the report is printed
+        if json_:
+            ctx.with_resource(redirect_stdout(output))
+
+    @cli.command('hasher')
+    @click.option('-q', '--quiet', is_flag=True, help='Supress output.')
+    @click.option('-v', '--verbose', is_flag=True, help='Prints new filenames.')
+    def hasher_command(quiet: bool, verbose: bool):
+        """Appends CRC32 hash to filenames."""
+        try: _profile.results = results = hasher()
+        except OSError as err: _fail(err)
+
+        for i in results['errors']: print(i)
+
+        if not quiet:
+            filenum = len(results['renamed'])
+            if verbose:
+                print(f'{filenum} files have been renamed:\n')
+                for name in results['renamed']: print(name)
+            else: print(f'{filenum} files have been renamed.')
+
+    @cli.command('remover')
+    @click.option('-q', '--quiet', is_flag=True, help='Supress output.')
+    @click.option('-v', '--verbose', is_flag=True, help='Prints new filenames.')
+    def remover_command(quiet: bool, verbose: bool):
+        """Removes CRC32 hash from filenames. Removes whitespace if needed."""
+        try: _profile.results = results = remover()
+        except OSError as err: _fail(err)
+
+        if not quiet:
+            filenum = len(results['renamed'])
+            if verbose:
+                print(f'{filenum} files have been renamed:\n')
+                print('\n'.join(results['renamed']))
+            else: print(f'{filenum} files have been renamed.')
+
+    @cli.command('checker')
+    def checker_command():
+        """Verifies CRC32 hashes in filenames."""
+        try: _profile.results = results = checker()
+        except OSError as err: _fail(err)
+
+        for name in results['ok']: click.secho(f'{name}  OK', fg='green')
+        for name in results['failed']: click.secho(f'{name}  ERR', fg='bright_red')
+        print(f'{len(results["ok"])} files OK, {len(results["failed"])} failed.')
+
+    @cli.group()
+    def renamer():
+        """Batch renames files."""
+
+    @renamer.command('simple')
+    @click.option('-G', '--group', prompt='Group name', metavar=r'"Group"', cls=_Option)
+    @click.option('-T', '--title', prompt='Show title', metavar=r'"Title"', cls=_Option)
+    @click.option('-S', '--src', prompt='Source', type=click.Choice(['BD', 'DVD', 'TV', 'WEB'], case_sensitive=False), cls=_Option)
+    @click.option('-R', '--res', prompt='Resolution <int>', metavar='INT', type=click.IntRange(72, 2160), cls=_Option)
+    @click.option('-q', '--quiet', is_flag=True, help='Supress output.')
+    @click.option('-v', '--verbose', is_flag=True, help='Prints new filenames.')
+    def simple_renamer_command(group: str, title: str, src: str, res: int, quiet: bool, verbose: bool):
+        """Renames from `ep##.mkv` to `[Group] Title - ## (SRC RESp).mkv`."""
+        try: _profile.results = results = simple_renamer(group, title, src, res)
+        except OSError as err: _fail(err)
+
+        if not quiet:
+            filenum = len(results['renamed'])
+            if verbose:
+                print(f'{filenum} files have been renamed:\n')
+                print('\n'.join(results['renamed']))
+            else:
+                print(f'{filenum} files have been renamed.')
+
+    @renamer.command('cleaner')
+    @click.option('-D', '--dryrun', is_flag=True, help='Prints new filenames without modifying them.')
+    @click.option('-G', '--group', prompt='Group name', metavar=r'"Group"', cls=_Option)
+    @click.option('-T', '--title', prompt='Show title', metavar=r'"Title"', cls=_Option)
+    @click.option('-S', '--src', prompt='Source', type=click.Choice(['BD', 'DVD', 'TV', 'WEB'], case_sensitive=False), cls=_Option)
+    @click.option('-R', '--res', prompt='Resolution <int>', metavar='INT', type=click.IntRange(72, 2160), cls=_Option)
+    def cleaner_command(dryrun: bool, group: str, title: str, src: str, res: int):
+        """Renames files based on unique 1-2 digit number found in original filename.
+
+Will find episode number from a '_#'/' #' or '_##'/' ##' sub-string in filename.
+
+WARNING: if same number is found in multiple filenames,
+files will be overwritten with one file. This is NOT reversible.
+
+Run with `--dryrun` to make sure your files have unique episode numbers.
+
+\b
+Files that are OK:
+    `re:zero 06v3.mkv` --> 06
+    `[Trash] rezero s2 episode 12[ABCD1234].mkv` --> 12
+    `[Trash] Re:Zero2_5.mkv` --> 05
+    `[Garbage *$ s1 ReZERO 1.mkv` --> 01
+
+\b
+Files that are NOT unique:
+    `re:zero season 2 06v3.mkv` --> 02
+    `[Trash] rezero s_2 episode 12[ABCD1234].mkv` --> 02
+    `[Trash] Re:Zero 2_5.mkv` --> 02
+    `[Garbage *$ s1 ReZERO 02.mkv` --> 02
+"""
+        try: _profile.results = results = cleaner(group, title, src, res, dryrun)
+        except OSError as err: _fail(err)
+
+        if dryrun:
+            for name, new_name in results['renamed'].items():
+                print(f'"{name}"')
+                if name in results['duplicates']:
+                    click.secho(f'\t--> "{new_name}"\tERR', fg='bright_red', bold=True, blink=True)
+                else:
+                    print(f'\t--> "{new_name}"')
+
+        for err in results['errors'].values():
+            click.secho(f'ERR: {err}', fg='bright_red')
+
+    @cli.command('diff')
+    @click.option('-D', '--dryrun', is_flag=True, help='Prints detected new versions without creating patches.')
+    @click.option('-W', '--windows', is_flag=True, default=False, help='Creates patch script for Windows users (requires xdelta3.exe in folder).')
+    @click.option('-j', '--jobs', type=click.IntRange(1), default=cpu_count(), help='Number of patches to create at once. (CPU count by default)')
+    @click.option('-v', '--verbose', is_flag=True, help='Prints all operations\' outputs.')
+    def diff_command(dryrun: bool, windows: bool, jobs: int, verbose: bool):
+        """Creates xdelta3 patches for newer file versions.
+
+Every older version of an episode gets a patch to the latest version (v1 --> v3 and v2 --> v3).
+The auto-patch scripts find the version the user has by the CRC32 in its filename.
+
+Packs patches, a README, and Windows / Linux auto-patch scripts into a .7z archive called "patches.7z".
+
+If running in --windows mode, you must have an xdelta3.exe binary in the same folder as the .mkv files.
+The exe can be downloaded from here: https://github.com/jmacd/xdelta-gpl/releases and needs to be renamed
+to `xdelta3.exe`.
+
+Should be used on files cleaned/renamed with renamer in the following format:
+
+
+    [Group] Title - ## (SRC RESp) [CRC32CRC].mkv
+
+    \b
+i.e.
+[ChannelOrange] Re:Zero Season 5 - 01 (BD 1080p) [468A23FD].mkv
+[ChannelOrange] Re:Zero Season 5 - 02 (BD 1080p) [BACB9212].mkv
+[ChannelOrange] Re:Zero Season 5 - 02v2 (BD 1080p) [E9F7A497].mkv
+[ChannelOrange] Re:Zero Season 5 - 03 (BD 1080p) [FBE791AF].mkv
+[ChannelOrange] Re:Zero Season 5 - 03v2 (BD 1080p) [CEDA7D89].mkv
+[ChannelOrange] Re:Zero Season 5 - 03v3 (BD 1080p) [0B6C1F52].mkv
+
+    Will create patches for episode 2 (v1 --> v2) and episode 3 (v1 --> v3 and v2 --> v3) only.
+
+Files are compared block by block first: identical files are only renamed by the patch scripts
+and files with only a few nearby changes are patched with a smaller (faster) xdelta3 source window.
+
+Run with `--dryrun` to see what episode patches will be created.
+"""
+        try: _profile.results = results = diff(dryrun, windows, jobs)
+        except (OSError, ValueError) as err: _fail(err)
+
+        episodes = {}
+        for patch in results['patches']:
+            episodes.setdefault(patch['episode'], []).append(patch)
+
+        if verbose:
+            for num, versions in results['episodes'].items():
+                for version in versions:
+                    if version > 1:
+                        print(f'Episode {num:02d} version {version} detected.')
+
+        if verbose or dryrun:
+            for patches in episodes.values():
+                for patch in patches:
+                    click.secho(patch['source'], fg='green')
+                click.secho(f'\t--> {patches[0]["target"]}', fg='bright_blue')
+
+        for patch in results['patches']:
+            if patch['frames'][0] != patch['frames'][1]:
+                click.secho(f'WARNING: episode {patch["episode"]:02d} v{patch["version"]} has {patch["frames"][0]} frames '
+                            f'but the latest version has {patch["frames"][1]}', fg='yellow')
+            if verbose or dryrun:
+                print(f'Episode {patch["episode"]:02d} v{patch["version"]}: {len(patch["changed_ranges"])} changed range(s), '
+                      f'{patch["changed_bytes"] / (1 << 20):.1f} MiB of {getsize(patch["target"]) / (1 << 20):.1f} MiB '
+                      f'--> {patch["strategy"]}')
+
+        for err in results['errors']:
+            click.secho(f'ERR: {err}', fg='bright_red')
+        if verbose and 'archive' in results:
+            print(results['archive'])
+
+    @cli.command('apply')
+    @click.option('-P', '--path', type=click.Path(exists=True, file_okay=False), default='.', help='Folder containing the patches. (current folder by default)')
+    @click.option('-j', '--jobs', type=click.IntRange(1), default=cpu_count(), help='Number of patches to apply at once. (CPU count by default)')
+    @click.option('-v', '--verbose', is_flag=True, help='Prints patched filenames.')
+    def apply_command(path: str, jobs: int, verbose: bool):
+        """Applies patches created with diff, verifying CRC32 hashes.
+
+Run inside the folder with the original .mkv files after extracting patches.7z into it.
+The version of each episode is found by its exact filename or by the CRC32 in its filename.
+
+The CRC32s in the original and patched filenames are verified, if any check fails
+the patched file is removed and the original is left in place.
+"""
+        try: _profile.results = results = apply(path, jobs)
+        except (OSError, ValueError) as err: _fail(err)
+
+        if verbose:
+            for num in results['missing']:
+                click.secho(f'Episode {num}: no known version found, skipping', fg='yellow')
+        for err in results['failed'].values():
+            click.secho(f'ERR: {err}', fg='bright_red')
+        if verbose:
+            for source, target in results['patched'].items():
+                click.secho(source, fg='green')
+                click.secho(f'\t--> {target}', fg='bright_blue')
+
+        print(f'{len(results["patched"])} files have been patched.')
+        if results['failed']:
+            exit(1)
+
+    @cli.command('watch')
+    @click.option('-G', '--group', metavar=r'"Group"', help='Renames new files with cleaner (requires all of -G/-T/-S/-R).')
+    @click.option('-T', '--title', metavar=r'"Title"')
+    @click.option('-S', '--src', type=click.Choice(['BD', 'DVD', 'TV', 'WEB'], case_sensitive=False))
+    @click.option('-R', '--res', metavar='INT', type=click.IntRange(72, 2160))
+    @click.option('-s', '--settle', type=click.FLOAT, default=10, help='Seconds a file\'s size must stay the same before it\'s processed. (10 by default)')
+    @click.option('-i', '--interval', type=click.FLOAT, default=5, help='Seconds between checks when polling. (5 by default)')
+    @click.option('-j', '--jobs', type=click.IntRange(1), default=1, help='Number of files to hash at once. (1 by default)')
+    @click.option('-P', '--poll', is_flag=True, help='Polls the folder instead of using inotify.')
+    def watch_command(group: str, title: str, src: str, res: int, settle: float, interval: float, jobs: int, poll: bool):
+        """Watches the folder and hashes new .mkv files as they are finished.
+
+A file is finished once its size hasn't changed for --settle seconds. Finished files are renamed
+with cleaner (if -G/-T/-S/-R are all given) and then get their CRC32 appended like hasher.
+Files that already have a CRC32 in their name are left alone, files already in the folder are processed too.
+
+Uses inotify on Linux and falls back to polling every --interval seconds elsewhere.
+At most --jobs files are hashed at once, the rest wait their turn. Stop with Ctrl+C.
+"""
+        if not poll:
+            if (events := _inotify('.')) is None:
+                click.secho('inotify unavailable, polling instead', fg='yellow')
+                poll = True
+            else:
+                events.close()
+
+        renamed, errors = _profile.results['renamed'], _profile.results['errors'] = {}, {}
+        try:
+            for name, new_name, err in watch(group, title, src, res, settle, interval, jobs, poll):
+                if err:
+                    errors[name] = err
+                    click.secho(f'ERR: {err}', fg='bright_red')
+                else:
+                    renamed[name] = new_name
+                    click.secho(name, fg='green')
+                    click.secho(f'\t--> {new_name}', fg='bright_blue')
+        except KeyboardInterrupt:
+            pass
+
+    @cli.command('bitrate')
+    @click.option('-S', '--size', type=click.FLOAT, help='Filesize (number only).', prompt=True, cls=_Option)
+    @click.option('-U', '--unit', type=click.Choice(['TB', 'GB', 'MB', 'kB', 'TiB', 'GiB', 'MiB', 'KiB'], case_sensitive=False), prompt=True, cls=_Option)
+    @click.option('-T', '--time', type=click.FLOAT, help='Time (in seconds) of clip.', default=0)
+    @click.option('-F', '--frames', type=click.INT, help='Number of frames in clip.', default=0)
+    @click.option('-R', '--framerate', default=24000/1001, type=click.FLOAT, help='Framerate (in fps) of clip. (23.976 by default)')
+    @click.option('-I', '--input', 'input_', type=click.Path(exists=True, dir_okay=False), help='Reads the duration from an .mkv file.')
+    def bitrate_command(size: float, unit: str, time: float, frames: int, framerate: float, input_: str):
+        """Converts a desired filesize into average bitrate in kbps.
+
+If specifying --time, you do not need to specify --frames and vice versa. Units will be prompted for if not specified.
+Both can be replaced with --input to read the duration from an existing .mkv file.
+
+\b
+Examples:
+    \b
+    For a 950 MiB file that is 24 minutes long:
+    $ python fansub_utils.py bitrate -S 950 -U mib -T 1440
+    > Bitrate should be 5,534 kbps.
+....
+    For a 2 GB file that is 34720 frames long:
+    $ python fansub_utils.py bitrate --size 2 -F 34720
+    > Unit (TB, GB, MB, kB, TiB, GiB, MiB, KiB): gb
+    > Bitrate should be 11,049 kbps."""
+        if not time and not frames and not input_:
+            _fail('--time or --frames must be specified.')
+
+        try: rate = bitrate(size, unit, time, frames, framerate, input_)
+        except (OSError, ValueError) as err: _fail(err)
+
+        _profile.results['kbps'] = rate
+        print(f'Bitrate should be {rate:,} kbps.')
+
+    @cli.command('filesize')
+    @click.option('-B', '--bitrate', 'bitrate_', type=click.INT, help='Average bitrate in kbps.', prompt=True, cls=_Option)
+    @click.option('-T', '--time', type=click.FLOAT, help='Time (in seconds) of clip.', default=0)
+    @click.option('-F', '--frames', type=click.INT, help='Number of frames in clip.', default=0)
+    @click.option('-R', '--framerate', default=24000/1001, type=click.FLOAT, help='Framerate (in fps) of clip. (23.976 by default)')
+    @click.option('-I', '--input', 'input_', type=click.Path(exists=True, dir_okay=False), help='Reads the duration from an .mkv file.')
+    def filesize_command(bitrate_: int, time: float, frames: int, framerate: float, input_: str):
+        """Estimates filesize based on average bitrate in kbps.
+
+--time and --frames can be replaced with --input to read the duration from an existing .mkv file.
+
+\b
+Examples:
+    \b
+    At 7,774 kbps for 32,000 frames:
+    $ python fansub_utils.py filesize -B 7774 -F 32000
+    > Estimated filesize is 1.21 GiB or 1.30 GB.
+....
+    At 5,736 kbps for 24 minutes:
+    $ python fansub_utils.py filesize -B 5736 -T 1440
+    > Estimated filesize is 984.65 MiB or 1.03 GB."""
+        if not time and not frames and not input_:
+            _fail('--time or --frames must be specified.')
+
+        try: bytes_ = filesize(bitrate_, time, frames, framerate, input_)
+        except (OSError, ValueError) as err: _fail(err)
+
+        if (bsize := bytes_ / (1 << 40)) >= 1: binary = 'Ti'
+        elif (bsize := bytes_ / (1 << 30)) >= 1: binary = 'Gi'
+        elif (bsize := bytes_ / (1 << 20)) >= 1: binary = 'Mi'
+        elif (bsize := bytes_ / (1 << 10)) >= 1: binary = 'Ki'
+        else: _fail('resulting filesize too small')
+
+        if (dsize := bytes_ / 1000 ** 4) >= 1: decimal = 'T'
+        elif (dsize := bytes_ / 1000 ** 3) >= 1: decimal = 'G'
+        elif (dsize := bytes_ / 1000 ** 2) >= 1: decimal = 'M'
+        elif (dsize := bytes_ / 1000) >= 1: decimal = 'k'
+        else: _fail('resulting filesize too small')
+
+        _profile.results['bytes'] = round(bytes_)
+        print(f'Estimated filesize is {bsize:.2f} {binary}B or {dsize:.2f} {decimal}B.')
+
+    @cli.command('edition-namer')
+    @click.option('-F', '--file', type=click.STRING, help='Output filename with xml extension.', prompt=True, cls=_Option)
+    @click.option('-L', '--language', type=click.STRING, help='Language tag for edition names (see ISO-639-2). (eng by default)', default='eng')
+    @click.option('-I', '--input', 'input_', type=click.Path(exists=True, dir_okay=False), help='Reads the EditionUIDs from an .mkv file.')
+    def edition_namer_command(file: str, language: str, input_: str):
+        """Outputs an xml file to name editions in a Mastroka Video file.
+
+Requires the EditionUIDs from a chapter file, or an .mkv file with chapters passed with --input.
+
+In order to properly mux this file into your .mkv file, add this file under 'Global tags' under Output > General in the MKVToolNix GUI or with `--global-tags file-name` via the command line.
+    """
+        editions = {}
+        if input_:
+            try: info = _mkv_info(input_)
+            except (OSError, ValueError) as err: _fail(err)
+            with _prompts(click.get_current_context()):
+                for uid in info['edition_uids']:
+                    editions[str(uid)] = input(f'Enter the edition name for edition {uid}: ')
+        else:
+            with _prompts(click.get_current_context()):
+                while temp := input(f'Enter edition UID #{len(editions) + 1} (press enter if done): '):
+                    editions[temp] = input(f'Enter the edition name for edition {temp}: ')
+
+        _profile.results.update(file=file, editions=editions)
+
+        try: edition_namer(file, editions, language)
+        except OSError as err: _fail(err)
+
+    return cli
+
+
+def main():
+    _build_cli()()
+
+
 if __name__ == '__main__':
-    cli()
+    main()
@@ -0,0 +1,18 @@
+from os import listdir
+from zlib import crc32
+
+import fansub_utils
+
+
+def test_watch_hashes_file_with_clean_name(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    name = '[Grp] Show - 05 (BD 1080p).mkv'
+    (tmp_path / name).write_bytes(b'episode')
+
+    events = fansub_utils.watch('Grp', 'Show', 'BD', 1080, settle=0, interval=0, poll=True)
+    try: processed = next(events)
+    finally: events.close()
+
+    hashed = f'[Grp] Show - 05 (BD 1080p) [{crc32(b"episode"):08X}].mkv'
+    assert processed == (name, hashed, None)
+    assert listdir('.') == [hashed]
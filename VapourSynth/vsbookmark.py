@@ -4,22 +4,27 @@ __date__ = '25 May 2020'
 
 import os
 import re
+from array import array
+from bisect import bisect_left
 from pathlib import Path
-from typing import Union
+from shutil import copymode
+from tempfile import NamedTemporaryFile
+from typing import Iterable, Tuple, Union
 
 import vapoursynth as vs
 
 core = vs.core
 
 
-def generate(clip: vs.VideoNode, /, script_path: Union[Path, str]):
+def generate(clip: Union[vs.VideoNode, Path, str], /, script_path: Union[Path, str], merge: bool = False, start: int = 0,
+             end: int = None, min_length: int = 0):
     """
     Generates keyframe bookmark file from `clip`.
 
     Some of this stolen from kageru's generate_keyframes
     (https://github.com/Irrational-Encoding-Wizardry/kagefunc)
 
-    :param clip:
+    :param clip: clip or path to a video file, opened with `vssource.source` to share its index between scripts
         :bit depth: ANY
         :color family: ANY
         :float precision: ANY
@@ -27,6 +32,16 @@ def generate(clip: vs.VideoNode, /, script_path: Union[Path, str]):
         :subsampling: ANY
 
     :param script_path: path to active VSEdit script (can be input simply as `__file__`)
+
+    :param merge: updates an existing bookmark file instead of skipping it (Default value = False)
+        Only bookmarks between `start` and `end` are replaced by the detected keyframes.
+
+    :param start: first frame to analyze (Default value = 0)
+
+    :param end: frame to stop analyzing at (Default value = None)
+        None analyzes until the end of the clip.
+
+    :param min_length: removes bookmarks less than this many frames after the previous one (Default value = 0)
     """
     if not Path(script_path).exists():
         raise ValueError('generate: script path not found')
@@ -34,61 +49,161 @@ def generate(clip: vs.VideoNode, /, script_path: Union[Path, str]):
         raise ValueError('generate: active script must be first saved as a `.vpy` file')
     bookmarks_path = str(script_path) + '.bookmarks'
 
-    if Path(bookmarks_path).exists():
+    if Path(bookmarks_path).exists() and not merge:
         print('generate: bookmark file already exists')
         return  # not super helpful as this doesn't print in the VSEdit log but prevents re-generating the bookmarks on second preview
 
+    if not isinstance(clip, vs.VideoNode):
+        from vssource import source
+        clip = source(clip)
+
+    end = clip.num_frames if end is None else min(end, clip.num_frames)
+    if not 0 <= start < end:
+        raise ValueError('generate: start must be before end')
+
     # speed up the analysis by resizing first
     clip = core.resize.Point(clip, 640, 360, format=clip.format.replace(bits_per_sample=8))
     clip = core.wwxd.WWXD(clip)
-    kf = '0'
-    for i in range(1, clip.num_frames):
+    kf = array('L', [start]) if start == 0 else array('L')
+    for i in range(max(start, 1), end):
         if clip.get_frame(i).props.Scenechange == 1:
-            kf += f', {i}'
+            kf.append(i)
+
+    # the analyzed range replaces what was bookmarked there before
+    bookmarks = _read_bookmarks(bookmarks_path)
+    lo, hi = bisect_left(bookmarks, start), bisect_left(bookmarks, end)
+    bookmarks = bookmarks[:lo] + kf + bookmarks[hi:]
 
-    text_file = open(bookmarks_path, 'w')
-    text_file.write(kf)
-    text_file.close()
+    _write_bookmarks(bookmarks_path, _thin(bookmarks, min_length))
 
 
-def convert(keyframe_path: Union[Path, str], script_path: Union[Path, str]):
+def convert(keyframe_path: Union[Path, str], script_path: Union[Path, str], merge: bool = False, min_length: int = 0):
     """
     Converts standard keyframe file to VSEdit bookmark format.
     Accepts WWXD qp-files and (SC)XviD keyframe files.
 
     :param keyframe_path: `'/path/to/keyframes.txt'`
     :param script_path: path to active VSEdit script (can be input simply as `__file__`)
+    :param merge: adds the keyframes to an existing bookmark file instead of overwriting it (Default value = False)
+    :param min_length: removes bookmarks less than this many frames after the previous one (Default value = 0)
     """
     if os.path.splitext(script_path)[1] != '.vpy':
         raise ValueError('generate: active script must be first saved as a `.vpy` file.')
     bookmarks_path = str(script_path) + '.bookmarks'
 
+    kf = _read_keyframes(keyframe_path)
+    if merge:
+        kf = _union(_read_bookmarks(bookmarks_path), kf)
+
+    _write_bookmarks(bookmarks_path, _thin(kf, min_length))
+
+
+def diff(keyframe_path: Union[Path, str], script_path: Union[Path, str]) -> Tuple[array, array]:
+    """
+    Compares a keyframe file to the active script's bookmarks.
+
+    :param keyframe_path: `'/path/to/keyframes.txt'`
+    :param script_path: path to active VSEdit script (can be input simply as `__file__`)
+
+    :returns: (keyframes that aren't bookmarked, bookmarks that aren't keyframes)
+    """
+    kf = _read_keyframes(keyframe_path)
+    bookmarks = _read_bookmarks(str(script_path) + '.bookmarks')
+
+    return _difference(kf, bookmarks), _difference(bookmarks, kf)
+
+
+def _read_keyframes(keyframe_path: Union[Path, str]) -> array:
+    """Reads a WWXD qp-file or (SC)XviD keyframe file into a sorted array of keyframes."""
     if (keyframe_path := Path(keyframe_path)).exists():
         lines = [line.rstrip() for line in keyframe_path.open()]
         lines = list(filter(None, lines))
 
+        kf = array('L')
         if 'WWXD' in lines[0]:
-            kf = '0'
+            kf.append(0)
             for i in range(2, len(lines)):
                 match = re.search(r'\d+', lines[i])
                 if match:
-                    kf += (', ' + match[0])
+                    kf.append(int(match[0]))
         elif 'XviD' in lines[0]:
             count = 0
-            kf = ''
             for i in range(len(lines)):
                 if lines[i][0] == 'i':
-                    kf += (str(count) + ', ')
+                    kf.append(count)
                     count += 1
                 elif lines[i][0] == 'p' or lines[i][0] == 'b':
                     count += 1
-            kf = kf[:-2]
 
         else:
             raise IOError('convert: keyframe file format could not be read')
     else:
         raise ValueError('convert: keyframe_path needs to be specified')
 
-    text_file = open(bookmarks_path, 'w')
-    text_file.write(kf)
-    text_file.close()
+    return _union(array('L'), sorted(kf))
+
+
+def _read_bookmarks(bookmarks_path: Union[Path, str]) -> array:
+    """Reads a VSEdit bookmark file into a sorted array of frames, empty if there is no file."""
+    try: text = Path(bookmarks_path).read_text()
+    except FileNotFoundError: return array('L')
+
+    return _union(array('L'), sorted(int(i) for i in re.findall(r'\d+', text)))
+
+
+def _write_bookmarks(bookmarks_path: Union[Path, str], bookmarks: Iterable[int]):
+    """Writes bookmarks in VSEdit's format, replacing the file at once so VSEdit never reads a half written file."""
+    folder = os.path.dirname(os.path.abspath(bookmarks_path))
+    with NamedTemporaryFile('w', dir=folder, suffix='.tmp', delete=False) as text_file:
+        text_file.write(', '.join(map(str, bookmarks)))
+
+    # temporary files are owner-only, keep the permissions of the file that's replaced (or the usual ones)
+    if os.path.exists(bookmarks_path):
+        copymode(bookmarks_path, text_file.name)
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(text_file.name, 0o666 & ~umask)
+    os.replace(text_file.name, bookmarks_path)
+
+
+def _union(a: Iterable[int], b: Iterable[int]) -> array:
+    """Merges two sorted sequences of frames into one sorted array without duplicates in O(n)."""
+    out = array('L')
+    a, b = iter(a), iter(b)
+    x, y = next(a, None), next(b, None)
+    while x is not None or y is not None:
+        if y is None or (x is not None and x <= y):
+            frame = x
+            x = next(a, None)
+        else:
+            frame = y
+            y = next(b, None)
+        if not out or out[-1] != frame:
+            out.append(frame)
+
+    return out
+
+
+def _difference(a: Iterable[int], b: Iterable[int]) -> array:
+    """Returns the frames of sorted `a` that aren't in sorted `b` in O(n)."""
+    out = array('L')
+    b = iter(b)
+    y = next(b, None)
+    for x in a:
+        while y is not None and y < x:
+            y = next(b, None)
+        if y != x:
+            out.append(x)
+
+    return out
+
+
+def _thin(bookmarks: Iterable[int], min_length: int) -> array:
+    """Removes bookmarks less than `min_length` frames after the previous kept one."""
+    out = array('L')
+    for frame in bookmarks:
+        if not out or frame - out[-1] >= min_length:
+            out.append(frame)
+
+    return out
@@ -3,11 +3,17 @@ __author__ = 'Dave <orangechannel@pm.me>'
 __date__ = '16 February 2020'
 
 import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import contextmanager
 from functools import partial
-from math import floor, sqrt
+from itertools import compress
+from math import ceil, floor
+from multiprocessing import get_context
 from random import randint, sample
-from typing import List, Union
+from re import fullmatch
+from runpy import run_path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 import vapoursynth as vs
 from vsutil import get_depth, get_subsampling  # https://github.com/Irrational-Encoding-Wizardry/vsutil
@@ -15,6 +21,72 @@ from vsutil import get_depth, get_subsampling  # https://github.com/Irrational-E
 core = vs.core  # requires fmtc:  https://github.com/EleonoreMizo/fmtconv
 
 
+class Frames:
+    """Frame selection for `comp` and `save` built from frame numbers and Python slices.
+
+    Accepts ints, slice / range objects, other Frames, or slice strings with the full Python slice syntax
+    ('100:200', ':16', '570:', '-500::24', '42'). Negative numbers and open ends are resolved against the
+    clips' length, overlapping selections are merged and the frames are always sorted and unique.
+
+    Frames('100:200', '150:300', 5) selects frames 5 and 100-299.
+    """
+
+    def __init__(self, *items: Union[int, str, slice, range, 'Frames']):
+        self.items = []
+        for item in items:
+            if isinstance(item, Frames): self.items += item.items
+            else: self.items.append(self._parse(item))
+        self._resolved = {}
+
+    @staticmethod
+    def _parse(item: Union[int, str, slice, range]) -> Union[int, slice]:
+        if isinstance(item, bool):
+            raise TypeError(f'Frames: invalid frame {item!r}')
+        if isinstance(item, int) or isinstance(item, slice):
+            return item
+        if isinstance(item, range):
+            return slice(item.start, item.stop, item.step)
+        if isinstance(item, str):
+            if m := fullmatch(r'\s*(-?\d+)\s*', item):
+                return int(m.group(1))
+            if m := fullmatch(r'\s*(-?\d+)?\s*:\s*(-?\d+)?\s*(?::\s*(-?\d+)?\s*)?', item):
+                start, stop, step = (int(i) if i is not None else None for i in m.groups())
+                if step == 0:
+                    raise ValueError(f'Frames: slice step cannot be zero in {item!r}')
+                return slice(start, stop, step)
+            raise ValueError(f'Frames: invalid slice {item!r}')
+        raise TypeError(f'Frames: invalid frame {item!r}')
+
+    def __bool__(self) -> bool:
+        return bool(self.items)
+
+    def resolve(self, num_frames: int) -> array:
+        """Returns the sorted, unique frame numbers selected in a clip of `num_frames` frames."""
+        if num_frames not in self._resolved:
+            selected = bytearray(num_frames)
+            for item in self.items:
+                if isinstance(item, int):
+                    if not -num_frames <= item < num_frames:
+                        raise ValueError(f'Frames: frame {item} is out of range for {num_frames} frames')
+                    selected[item] = 1
+                else:
+                    selected[item] = b'\1' * len(range(*item.indices(num_frames)))
+
+            self._resolved[num_frames] = array('L', compress(range(num_frames), selected))
+
+        return self._resolved[num_frames]
+
+    def ranges(self, num_frames: int) -> Iterator[Tuple[int, int]]:
+        """Yields the selected frames as merged (start, stop) ranges."""
+        frames = self.resolve(num_frames)
+        start = None
+        for i, f in enumerate(frames):
+            if start is None: start = f
+            if i + 1 == len(frames) or frames[i + 1] != f + 1:
+                yield start, f + 1
+                start = None
+
+
 def prep(*clips: vs.VideoNode, w: int = 1280, h: int = 720, dith: bool = True, yuv444: bool = True, static: bool = True) \
         -> Union[vs.VideoNode, List[vs.VideoNode]]:
     """Prepares multiple clips of diff sizes/bit-depths to be compared.
@@ -99,14 +171,15 @@ def prep(*clips: vs.VideoNode, w: int = 1280, h: int = 720, dith: bool = True, y
     return outclips
 
 
-def save(*frames: int, rand: int = 0, folder: bool = False, zoom: int = 1, **clips: vs.VideoNode):
+def save(*frames: Union[int, str, slice, Frames], rand: int = 0, folder: bool = False, zoom: int = 1,
+         **clips: Union[vs.VideoNode, str, os.PathLike]):
     """
     Writes frames as named RGB24 PNG files for easy upload to slowpics.org.
 
     Running "save(17, 24, rand=2, folder=True, zoom=3, BD=bd, TV=tv)"
     will save four 3x-point-upscaled frames (17, 24, and 2 randoms) in folders named 'BD' and 'TV'.
 
-    :param frames: frame number(s) to save
+    :param frames: frame number(s), slices or a `Frames` selection to save
 
     :param rand: number of random frames to extract (Default value = 0)
 
@@ -116,19 +189,15 @@ def save(*frames: int, rand: int = 0, folder: bool = False, zoom: int = 1, **cli
     :param zoom: zoom factor (Default value = 1)
 
     :param clips: comma separated pairs of name=clip to save frames from
+        A path to a video file is opened with `vssource.source`, sharing its index between scripts.
         :bit depth: ANY
         :color family: ANY
         :float precision: ANY
         :sample type: ANY
         :subsampling: ANY
     """
-    frames = list(frames)
-    if len(frames) == 0 and rand < 1: rand = 1
-
-    if rand > 0:
-        max_frame = min(clip.num_frames for name, clip in clips.items()) - 1
-        if rand == 1: frames.append(randint(0, max_frame))
-        else: frames = frames + sample(range(max_frame), rand)
+    clips = _open(clips)
+    frames = _select(Frames(*frames), rand, min(clip.num_frames for name, clip in clips.items()))
 
     if folder:
         for name, clip in clips.items():
@@ -150,22 +219,71 @@ def save(*frames: int, rand: int = 0, folder: bool = False, zoom: int = 1, **cli
                 out.get_frame(0)
 
 
-def comp(*frames: int, rand: int = 0, slicing: bool = False, slices: List[str] = None, full: bool = False, label: bool = True,
-         label_size: int = 30, label_alignment: int = 7, stack_type: str = 'clip', **in_clips: vs.VideoNode) -> vs.VideoNode:
+def save_parallel(script: str, *frames: Union[int, str, slice, Frames], rand: int = 0, folder: bool = False,
+                  zoom: int = 1, workers: int = None, prep_args: dict = None, **clips: Union[str, int]):
+    """
+    Writes frames like `save`, split between worker processes that each run their own VapourSynth core.
+
+    Error diffusion dithering (`prep(static=True)`) renders each frame on one thread,
+    so large screenshot sets are much faster when several frames are rendered at once.
+    Every worker runs `script` to build the clips, optionally `prep`s them and saves its share of the frames.
+
+    Running "save_parallel('comp.vpy', '1000::5000', folder=True, prep_args=dict(w=1920, h=1080), BD='bd', TV=0)"
+    will save every 5000th frame from frame 1000 of the `bd` variable and output 0 of comp.vpy.
+
+    Must be called from a regular Python script (inside `if __name__ == '__main__':`), not from a previewed script.
+
+    :param script: path to a VapourSynth script creating the clips
+
+    :param frames: frame number(s), slices or a `Frames` selection to save
+
+    :param rand: number of random frames to extract (Default value = 0)
+
+    :param folder: saves images into named sub-folders (Default value = False)
+        If True, saving will not prefix image files with clip name.
+
+    :param zoom: zoom factor (Default value = 1)
+
+    :param workers: number of worker processes (Default value = CPU count)
+
+    :param prep_args: keyword arguments for `prep`, which is skipped if None (Default value = None)
+
+    :param clips: comma separated pairs of name=variable name or output index in `script` to save frames from
+    """
+    workers = workers or os.cpu_count() or 1
+    nodes = _script_clips(script, clips)
+    selected = _select(Frames(*frames), rand, min(clip.num_frames for clip in nodes.values()))
+
+    # the frames are dealt out so every worker gets a similar mix of scenes
+    shards = [selected[i::workers].tolist() for i in range(min(workers, len(selected)))]
+    threads = max(1, (os.cpu_count() or 1) // len(shards))
+
+    # spawned workers start with a fresh core instead of a forked copy of this one
+    with ProcessPoolExecutor(len(shards), mp_context=get_context('spawn')) as executor:
+        futures = [executor.submit(_save_shard, script, shard, folder, zoom, prep_args, threads, clips) for shard in shards]
+        for future in futures:
+            future.result()
+
+
+def comp(*frames: Union[int, str, slice, Frames], rand: int = 0, slicing: bool = False, slices: List[str] = None, full: bool = False, label: bool = True,
+         label_size: int = 30, label_alignment: int = 7, stack_type: str = 'clip', mosaic_size: Tuple[int, int] = None,
+         split_type: str = 'vertical', diff_amp: float = 4.0, diff_originals: bool = True,
+         **in_clips: Union[vs.VideoNode, str, os.PathLike]) -> vs.VideoNode:
     """
     All-encompassing comparison tool for VapourSynth preview.
 
     Allows an infinite number of clips to be compared.
     Can compare entire clips, frames, or slices.
-    Visually arranges clips in five ways:
+    Visually arranges clips in six ways:
         continuous clip (A0 B0 A1 B1)
         vertical stacking
         horizontal stacking
         mosaic
-        split (A | B [| C])
+        split (A | B | C ...)
+        difference heatmaps (A | B | |B - A|)
 
-    :param frames: frame number(s) to be compared
-        Can be left blank.
+    :param frames: frame number(s), slices or a `Frames` selection to be compared
+        Can be left blank. Frames are compared in order, each frame only once.
 
     :param rand: number of random frames to compare from all clips (Default value = 0)
         Can be left blank.
@@ -174,7 +292,7 @@ def comp(*frames: int, rand: int = 0, slicing: bool = False, slices: List[str] =
         Overrides 'frames' and 'rand'.
 
     :param slices: Python slices of all clips to be compared (Default value = None)
-        Does not accept advanced / combined slicing.
+        Accepts anything `Frames` does, including steps and negative numbers.
         Example: '[":16","200:400","570:"]' for frames 0-15,200-399,570+
         Can be left blank is slicing is False.
 
@@ -188,10 +306,27 @@ def comp(*frames: int, rand: int = 0, slicing: bool = False, slices: List[str] =
     :param label_alignment: numpad alignment of 'label' (Default value = 7)
 
     :param stack_type: type of comparison to output (Default value = 'clip')
-        Accepts 'clip', 'vertical', 'horizontal', 'mosaic', 'split'.
-        'split' allows only 2 or 3 clips and overrides 'label_alignment'
+        Accepts 'clip', 'vertical', 'horizontal', 'mosaic', 'split', 'diff'.
+        'split' requires at least 2 clips and overrides 'label_alignment'
+        'diff' requires at least 2 clips and compares every clip to the first one
+        'mosaic' picks the rows x columns layout with the least wasted area (see `_mosaic_layout`).
+
+    :param mosaic_size: (width, height) in px for the 'mosaic' to fit in (Default value = None)
+        Clips are downscaled (before labeling) if the mosaic would be larger.
+        Its aspect ratio is also used to pick the layout instead of the clips' aspect ratio.
+
+    :param split_type: how the frame is split between clips for 'split' (Default value = 'vertical')
+        Accepts 'vertical' (side by side strips), 'horizontal' (stacked strips),
+        'diagonal' (diagonal bands from the top left), 'checkerboard' (alternating tiles).
+
+    :param diff_amp: how much differences are amplified for 'diff' (Default value = 4.0)
+        The heatmap goes from black (no difference) through red and yellow to white (1 / diff_amp of the range).
+
+    :param diff_originals: stacks the first clip and each compared clip next to its 'diff' heatmap (Default value = True)
+        False only stacks the heatmaps vertically.
 
     :param in_clips: comma separated pairs of name=clip
+        A path to a video file is opened with `vssource.source`, sharing its index between scripts.
         :bit depth: ANY
         :color family: ANY
         :float precision: ANY
@@ -201,124 +336,121 @@ def comp(*frames: int, rand: int = 0, slicing: bool = False, slices: List[str] =
     :returns: processed clip
     """
 
+    # labels are rendered once per comp call for each text / size / alignment / clip format
+    labels = {}
+
     def _markclips(clips, names, label_size, label_alignment) -> List[vs.VideoNode]:
-        style = f'sans-serif,{label_size},&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,3,1,' \
-                f'{label_alignment},10,10,10,1'
-        margins = [10, 0, 10, 0]
         markedclips = []
 
         if type(clips) == vs.VideoNode:
-            return core.sub.Subtitle(clips, str(names), style=style, margins=margins)
+            return _label(clips, str(names), label_size, label_alignment, labels)
         else:
             for name, clip in zip(names, clips):
-                markedclip = core.sub.Subtitle(clip, str(name), style=style, margins=margins)
+                markedclip = _label(clip, str(name), label_size, label_alignment, labels)
                 markedclips.append(markedclip)
 
         return markedclips
 
     def _cutclips(clips, frames, rand) -> List[vs.VideoNode]:
+        num_frames = min(clip.num_frames for clip in clips)
         if slicing:
-            cut_clips = []
-            for i, clip in enumerate(clips):
-                cut_clips.append(core.std.BlankClip(clip, length=1))
-                for s in slices:
-                    a, b = s.split(':')
-                    if a == '': cut_clips[i] += clip[:int(b)]
-                    elif b == '': cut_clips[i] += clip[int(a):]
-                    else: cut_clips[i] += clip[int(a):int(b)]
+            if not (selected := Frames(*(slices or [])).resolve(num_frames)):
+                raise ValueError('comp: no frames selected by slices')
+        else: selected = _select(Frames(*frames), rand, num_frames)
 
-        else:
-            if len(frames) == 0 and rand < 1: rand = 1
-            if rand > 0:
-                max_frame = min(clip.num_frames for clip in clips) - 1
-                if rand == 1: frames.append(randint(0, max_frame))
-                else: frames = frames + sample(range(max_frame), rand)
-
-            cut_clips = []
-            for i, clip in enumerate(clips):
-                cut_clips.append(core.std.BlankClip(clip, length=1))
-                for f in frames: cut_clips[i] += clip[f]
-
-        for i in range(len(cut_clips)): cut_clips[i] = cut_clips[i][1:]
-
-        return cut_clips
+        return [_remap(clip, selected) for clip in clips]
 
     def _assemble(markedclips: List[vs.VideoNode], stack_type: str) -> vs.VideoNode:
 
-        def _stack2d(clips, size):
-            rows = []
-            for i in range(0, size):
-                min_s = (i * size)
-                max_s = ((i + 1) * size)
-                if i == 0:
-                    row_clips = clips[:max_s]
-                    rows.append(core.std.StackHorizontal(row_clips))
-                else:
-                    row_clips = clips[min_s:max_s]
-                    rows.append(core.std.StackHorizontal(row_clips))
-
-            return core.std.StackVertical(rows)
-
-        def _root_check(clips):
-
-            def _blank_create(clips, size):
-                blank_clips = []
-                blank_number = (size ** 2) - len(clips)
-                for _ in range(0, blank_number): blank_clips.append(core.std.BlankClip(clips[0], length=1))
-                added_clips = clips + blank_clips
-
-                return _stack2d(added_clips, size)
+        def _stack2d(clips, rows, cols):
+            stacked = []
+            for i in range(0, rows * cols, cols):
+                row_clips = clips[i:i + cols]
+                if len(row_clips) < cols:
+                    # one static blank for the rest of the last row instead of a full size BlankClip per missing tile
+                    row_clips.append(core.std.BlankClip(row_clips[0], width=(cols - len(row_clips)) * row_clips[0].width,
+                                                        length=row_clips[0].num_frames, keep=True))
+                stacked.append(core.std.StackHorizontal(row_clips))
 
-            root = sqrt(len(clips))
-            size = floor(root) + 1
-
-            if int(root + 0.5) ** 2 != len(clips):
-                return _blank_create(clips, size)
-            else:
-                return _stack2d(clips, int(root))
+            return core.std.StackVertical(stacked)
 
         def _split(clips):
-            width = clips[0].width
-            if len(clips) == 2:
-                clip_left = _markclips(clips[0], names[0], label_size, 7)
-                clip_right = _markclips(clips[1], names[1], label_size, 9)
-
-                clip_left = core.std.Crop(clip_left, 0, width / 2, 0, 0)
-                clip_right = core.std.Crop(clip_right, width / 2, 0, 0, 0)
-
-                clips_list = clip_left, clip_right
-
-                return core.std.StackHorizontal(clips_list)
-
-            if len(clips) == 3:
-                width = floor(width / 3)
-                dwidth = 2 * width
-
-                clip_left = _markclips(clips[0], names[0], label_size, 7)
-                clip_middle = _markclips(clips[1], names[1], label_size, 8)
-                clip_right = _markclips(clips[2], names[2], label_size, 9)
-
-                clip_left = core.std.Crop(clip_left, 0, dwidth, 0, 0)
-                clip_middle = core.std.Crop(clip_middle, width, width, 0, 0)
-                clip_right = core.std.Crop(clip_right, dwidth, 0, 0, 0)
+            width, height = clips[0].width, clips[0].height
+            n = len(clips)
+
+            if split_type in ('vertical', 'horizontal'):
+                # every clip is cropped to its strip first, so only the visible part is labeled and rendered
+                vertical = split_type == 'vertical'
+                size = width if vertical else height
+                mod = 1 << (clips[0].format.subsampling_w if vertical else clips[0].format.subsampling_h)
+                step = floor(size / n / mod) * mod
+                if step < mod:
+                    raise ValueError(f'comp: clips are too small to be split {n} ways')
+
+                strips = []
+                for i, clip in enumerate(clips):
+                    start = i * step
+                    length = step if i < n - 1 else size - start
+                    if vertical: strip = core.std.CropAbs(clip, length, height, left=start)
+                    else: strip = core.std.CropAbs(clip, width, length, top=start)
+
+                    if label:
+                        edge = 0 if i == 0 else 2 if i == n - 1 else 1
+                        alignment = (7, 8, 9)[edge] if vertical else (7, 4, 1)[edge]
+                        strip = _markclips(strip, names[i], label_size, alignment)
+                    strips.append(strip)
+
+                return core.std.StackHorizontal(strips) if vertical else core.std.StackVertical(strips)
+
+            # diagonal bands / checkerboard tiles are merged with masks computed once
+            region, positions = _split_regions(n, width, height, split_type)
+            x, y = _ramps(width, height)
+            mask_format = clips[0].format.replace(color_family=vs.GRAY, subsampling_w=0, subsampling_h=0)
+            peak = 1 if mask_format.sample_type == vs.FLOAT else (1 << mask_format.bits_per_sample) - 1
+
+            split = clips[0]
+            for i in range(1, n):
+                mask = core.std.Expr([x, y], f'{region} {i} = {peak} 0 ?', format=mask_format.id)
+                split = core.std.MaskedMerge(split, clips[i], mask * clips[i].num_frames, first_plane=True)
+
+            if label:
+                for name, (pos_x, pos_y) in zip(names, positions):
+                    split = _markclips(split, f'{{\\an5\\pos({pos_x},{pos_y})}}{name}', label_size, 5)
+
+            return split
+
+        def _diff(clips, markedclips):
+            # heatmaps are computed from the unlabeled clips so labels don't show up as differences
+            rows = []
+            for i in range(1, len(clips)):
+                heatmap = _heatmap(clips[0], clips[i], diff_amp)
+                if label: heatmap = _markclips(heatmap, f'{names[i]} - {names[0]}', label_size, label_alignment)
 
-                clips_list = clip_left, clip_middle, clip_right
+                if diff_originals: rows.append(core.std.StackHorizontal([markedclips[0], markedclips[i], heatmap]))
+                else: rows.append(heatmap)
 
-                return core.std.StackHorizontal(clips_list)
+            return core.std.StackVertical(rows)
 
         if stack_type == 'vertical':
             return core.std.StackVertical(markedclips)
-        elif stack_type == 'horizontal' or (stack_type == 'mosaic' and len(markedclips) < 3):
+        elif stack_type == 'horizontal':
             return core.std.StackHorizontal(markedclips)
         elif stack_type == 'mosaic':
-            return _root_check(markedclips)
-        elif stack_type == 'split' and (len(clips) < 2 or len(clips) > 3):
-            raise ValueError('comp: \'split\' stack_type only allows 2 or 3 clips')
+            return _stack2d(markedclips, *layout)
+        elif stack_type == 'split' and len(clips) < 2:
+            raise ValueError('comp: \'split\' stack_type requires at least 2 clips')
+        elif stack_type == 'split' and split_type not in ('vertical', 'horizontal', 'diagonal', 'checkerboard'):
+            raise ValueError('comp: split_type must be \'vertical\', \'horizontal\', \'diagonal\' or \'checkerboard\'')
         elif stack_type == 'split':
             return _split(clips)
+        elif stack_type == 'diff' and len(clips) < 2:
+            raise ValueError('comp: \'diff\' stack_type requires at least 2 clips')
+        elif stack_type == 'diff':
+            return _diff(clips, markedclips)
         else:
             return core.std.Interleave(markedclips)
 
+    in_clips = _open(in_clips)
     names = list(in_clips.keys())
     clips = list(in_clips.values())
 
@@ -331,10 +463,22 @@ def comp(*frames: int, rand: int = 0, slicing: bool = False, slices: List[str] =
             raise ValueError("comp: the format of all clips must be the same")
 
     if not full:
-        frames = list(frames)
         clips = _cutclips(clips, frames, rand)
 
-    if label: markedclips = _markclips(clips, names, label_size, label_alignment)
+    if stack_type == 'mosaic':
+        width, height = clips[0].width, clips[0].height
+        aspect = mosaic_size[0] / mosaic_size[1] if mosaic_size else None
+        layout = rows, cols = _mosaic_layout(len(clips), width, height, aspect)
+
+        if mosaic_size and (scale := min(mosaic_size[0] / (cols * width), mosaic_size[1] / (rows * height))) < 1:
+            # downscaled before labeling so labels keep their size, tiles are kept mod subsampling
+            mod_w, mod_h = 1 << clips[0].format.subsampling_w, 1 << clips[0].format.subsampling_h
+            tile_w = max(mod_w, floor(width * scale / mod_w) * mod_w)
+            tile_h = max(mod_h, floor(height * scale / mod_h) * mod_h)
+            clips = [core.resize.Bicubic(clip, tile_w, tile_h, filter_param_a=0, filter_param_b=0) for clip in clips]
+
+    # split labels only the visible part of each clip itself
+    if label and stack_type != 'split': markedclips = _markclips(clips, names, label_size, label_alignment)
     else: markedclips = clips
 
     return _assemble(markedclips, stack_type)
@@ -355,6 +499,224 @@ mcomp = partial(comp, stack_type='mosaic')
 # Split comparison alias
 scomp = partial(comp, stack_type='split')
 
+# Difference heatmap comparison alias
+dcomp = partial(comp, stack_type='diff')
+
+
+def _script_clips(script: str, clips: Dict[str, Union[str, int]]) -> Dict[str, vs.VideoNode]:
+    """Runs a VapourSynth script, returning its clips by variable name or output index."""
+    namespace = run_path(script, run_name='__vapoursynth__')
+
+    nodes = {}
+    for name, source in clips.items():
+        if isinstance(source, int):
+            output = vs.get_output(source)
+            nodes[name] = getattr(output, 'clip', output)
+        elif isinstance(namespace.get(source), vs.VideoNode):
+            nodes[name] = namespace[source]
+        else:
+            raise ValueError(f'save_parallel: no clip named {source!r} in {script}')
+
+    return nodes
+
+
+def _save_shard(script: str, frames: List[int], folder: bool, zoom: int, prep_args: Optional[dict], threads: int,
+                clips: Dict[str, Union[str, int]]):
+    """Worker process of `save_parallel`."""
+    core.num_threads = threads
+    nodes = _script_clips(script, clips)
+
+    if prep_args is not None:
+        prepped = prep(*nodes.values(), **prep_args)
+        nodes = dict(zip(nodes, [prepped] if isinstance(prepped, vs.VideoNode) else prepped))
+
+    save(*frames, folder=folder, zoom=zoom, **nodes)
+
+
+def _open(clips: Dict[str, Union[vs.VideoNode, str, os.PathLike]]) -> Dict[str, vs.VideoNode]:
+    """Opens the clips given as paths through the shared index cache."""
+    if all(isinstance(clip, vs.VideoNode) for clip in clips.values()):
+        return clips
+
+    from vssource import source
+    return {name: clip if isinstance(clip, vs.VideoNode) else source(clip) for name, clip in clips.items()}
+
+
+def _select(frames: Frames, rand: int, num_frames: int) -> array:
+    """Resolves `frames` with `rand` random frames added (or one if nothing was selected)."""
+    if not frames and rand < 1: rand = 1
+
+    if rand > 0:
+        max_frame = num_frames - 1
+        if rand == 1: frames = Frames(frames, randint(0, max_frame))
+        else: frames = Frames(frames, *sample(range(max_frame), rand))
+
+    if not (selected := frames.resolve(num_frames)):
+        raise ValueError('Frames: no frames selected')
+
+    return selected
+
+
+def _remap(clip: vs.VideoNode, frames: array) -> vs.VideoNode:
+    """Returns only `frames` of `clip`, with one lazily evaluated node instead of splicing every frame."""
+    if len(frames) == frames[-1] - frames[0] + 1:
+        return clip[frames[0]:frames[-1] + 1]
+
+    # frames are sorted and unique, so output frame n is frame n of `clip` trimmed by frames[n] - n,
+    # which is the same trimmed node for every frame of a run of consecutive frames
+    shifted = {offset: clip[offset:] for offset in {f - n for n, f in enumerate(frames)}}
+
+    return core.std.FrameEval(core.std.BlankClip(clip, length=len(frames)), lambda n: shifted[frames[n] - n])
+
+
+def _mosaic_layout(num: int, width: int, height: int, aspect: Optional[float] = None) -> Tuple[int, int]:
+    """Returns the (rows, columns) of a mosaic of `num` clips of `width` x `height` with the least wasted area.
+
+    Wasted area is everything in the smallest `aspect` ratio box around the mosaic that isn't covered by clips,
+    so both blank tiles and very wide/tall layouts are avoided. Ties go to fewer tiles, then fewer rows.
+
+    :param aspect: aspect ratio of the display (Default value = None)
+        None uses the aspect ratio of the clips.
+    """
+    aspect = aspect or width / height
+    best = None
+    for cols in range(1, num + 1):
+        rows = ceil(num / cols)
+        mosaic_w, mosaic_h = cols * width, rows * height
+        waste = max(mosaic_w, mosaic_h * aspect) * max(mosaic_h, mosaic_w / aspect) - num * width * height
+        if best is None or (waste, rows * cols, rows) < best[0]:
+            best = (waste, rows * cols, rows), (rows, cols)
+
+    return best[1]
+
+
+def _render_label(clip: vs.VideoNode, text: str, size: int, alignment: int) \
+        -> Optional[Tuple[vs.VideoNode, vs.VideoNode, int, int]]:
+    """Renders a label once with libass, returning the (overlay, mask, left, top) of the area it covers.
+
+    The overlay is in `clip`'s format, the mask is in its bit depth and both are a single frame.
+    Returns None if nothing was drawn.
+    """
+    style = f'sans-serif,{size},&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,3,1,' \
+            f'{alignment},10,10,10,1'
+    overlay, alpha = core.sub.Subtitle(core.std.BlankClip(clip, length=1), text, style=style, margins=[10, 0, 10, 0],
+                                       blend=False)
+
+    frame = alpha.get_frame(0)
+    try: plane = frame[0]
+    except TypeError: plane = frame.get_read_array(0)
+    data = memoryview(plane).tobytes()
+
+    # bounding box of the label's (outlined) pixels, a sample is zero only if all of its bytes are
+    width, height, bps = alpha.width, alpha.height, alpha.format.bytes_per_sample
+    rows = [(i, data[i * width * bps:(i + 1) * width * bps]) for i in range(height)]
+    rows = [(i, row) for i, row in rows if row.strip(b'\0')]
+    if not rows:
+        return None
+    x0 = min(len(row) - len(row.lstrip(b'\0')) for _, row in rows) // bps
+    x1 = -(-max(len(row.rstrip(b'\0')) for _, row in rows) // bps)
+    y0, y1 = rows[0][0], rows[-1][0] + 1
+
+    # kept mod subsampling so the area can be cropped out of the clip
+    mod_w, mod_h = 1 << clip.format.subsampling_w, 1 << clip.format.subsampling_h
+    left, top = floor(x0 / mod_w) * mod_w, floor(y0 / mod_h) * mod_h
+    right, bottom = min(width, ceil(x1 / mod_w) * mod_w), min(height, ceil(y1 / mod_h) * mod_h)
+
+    overlay = core.std.CropAbs(overlay, right - left, bottom - top, left=left, top=top)
+    mask = core.std.CropAbs(alpha, right - left, bottom - top, left=left, top=top)
+
+    if clip.format.color_family == vs.RGB:
+        overlay = core.resize.Point(overlay, format=clip.format.id)
+    else:
+        overlay = core.resize.Bicubic(overlay, format=clip.format.id, matrix_s='709')
+
+    mask_format = clip.format.replace(color_family=vs.GRAY, subsampling_w=0, subsampling_h=0)
+    if mask_format.id != mask.format.id:
+        mask = core.resize.Point(mask, format=mask_format.id, range_in_s='full', range_s='full')
+
+    return overlay, mask, left, top
+
+
+def _label(clip: vs.VideoNode, text: str, size: int, alignment: int, cache: dict) -> vs.VideoNode:
+    """Draws `text` on `clip` like sub.Subtitle, but only merges a pre-rendered label into the area it covers.
+
+    :param cache: rendered labels by (text, size, alignment, format, width, height)
+    """
+    key = (text, size, alignment, clip.format.id, clip.width, clip.height)
+    if key not in cache:
+        cache[key] = _render_label(clip, text, size, alignment)
+    if cache[key] is None:
+        return clip
+
+    overlay, mask, left, top = cache[key]
+    width, height = overlay.width, overlay.height
+    right, bottom = clip.width - left - width, clip.height - top - height
+
+    area = core.std.CropAbs(clip, width, height, left=left, top=top)
+    area = core.std.MaskedMerge(area, overlay * clip.num_frames, mask * clip.num_frames, first_plane=True)
+
+    row = [core.std.CropAbs(clip, left, height, top=top)] if left else []
+    row += [area] + ([core.std.CropAbs(clip, right, height, left=left + width, top=top)] if right else [])
+    rows = [core.std.CropAbs(clip, clip.width, top)] if top else []
+    rows += [core.std.StackHorizontal(row)] + ([core.std.CropAbs(clip, clip.width, bottom, top=top + height)] if bottom else [])
+
+    return core.std.StackVertical(rows)
+
+
+def _heatmap(ref: vs.VideoNode, clip: vs.VideoNode, amp: float) -> vs.VideoNode:
+    """Returns a heatmap of the absolute differences between `ref` and `clip` in `clip`'s format.
+
+    Compares luma (or the largest difference of R, G and B), amplified by `amp`, with std.Expr.
+    """
+    fmt = clip.format
+    peak = 1 if fmt.sample_type == vs.FLOAT else (1 << fmt.bits_per_sample) - 1
+
+    if fmt.color_family == vs.RGB:
+        planes = [core.std.ShufflePlanes(c, i, vs.GRAY) for c in (ref, clip) for i in range(3)]
+        expr = 'x a - abs y b - abs max z c - abs max'
+    else:
+        planes = [core.std.ShufflePlanes(c, 0, vs.GRAY) for c in (ref, clip)]
+        expr = 'x y - abs'
+    diff = core.std.Expr(planes, f'{expr} {amp} * {peak} / 1 min', format=vs.GRAYS)
+
+    # black -> red -> yellow -> white
+    heatmap = [core.std.Expr(diff, f'x 3 * {i} - 0 max 1 min') for i in range(3)]
+    heatmap = core.std.ShufflePlanes(heatmap, [0, 0, 0], vs.RGB)
+
+    if fmt.color_family == vs.RGB:
+        return core.resize.Point(heatmap, format=fmt.id)
+    return core.resize.Bicubic(heatmap, format=fmt.id, matrix_s='709')
+
+
+def _ramps(width: int, height: int) -> Tuple[vs.VideoNode, vs.VideoNode]:
+    """Returns single frame GRAYS clips of (x + 0.5) / width and (y + 0.5) / height for every pixel."""
+    black = core.std.BlankClip(width=1, height=1, format=vs.GRAYS, length=1, color=[0.0])
+    white = core.std.BlankClip(black, color=[1.0])
+
+    # bilinear between the two pixel centers is exactly linear
+    x = core.resize.Bilinear(core.std.StackHorizontal([black, white]), width, height, src_left=0.5, src_width=1)
+    y = core.resize.Bilinear(core.std.StackVertical([black, white]), width, height, src_top=0.5, src_height=1)
+
+    return x, y
+
+
+def _split_regions(num: int, width: int, height: int, split_type: str) -> Tuple[str, List[Tuple[int, int]]]:
+    """Returns the std.Expr (on `_ramps`) giving the clip number of every pixel, and a label position for each clip."""
+    if split_type == 'diagonal':
+        # bands along x + y, labeled where they cross the top left to bottom right diagonal
+        positions = [(round((i + 0.5) / num * width), round((i + 0.5) / num * height)) for i in range(num)]
+        return f'x y + {num} * 2 / floor', positions
+
+    rows = 4
+    cols = max(1, round(rows * width / height))
+    cells = [(row, col) for row in range(rows) for col in range(cols)]
+    positions = []
+    for i in range(num):
+        row, col = next(((row, col) for row, col in cells if (row + col) % num == i), cells[-1])
+        positions.append((round((col + 0.5) * width / cols), round((row + 0.5) * height / rows)))
+
+    return f'x {cols} * floor y {rows} * floor + dup {num} / floor {num} * -', positions
+
 
 @contextmanager
 def _cd(newdir):
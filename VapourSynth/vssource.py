@@ -0,0 +1,86 @@
+"""Opens video sources through an index cache shared between VapourSynth scripts."""
+__author__ = 'Dave <orangechannel@pm.me>'
+__date__ = '2 June 2020'
+
+import os
+from hashlib import sha1
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+import vapoursynth as vs
+
+core = vs.core  # requires lsmas (with `cachefile`) or ffms2
+
+# index files are kept here unless a cache_dir is given
+CACHE_DIR = os.environ.get('VSSOURCE_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'vssource')
+
+_INDEXERS = {'lsmas': '.lwi', 'ffms2': '.ffindex'}
+
+# clips opened in each VapourSynth environment (core) by (file key, indexer, source filter arguments),
+# so a script reloaded by VSEdit in a new environment never gets clips of the old core back
+_nodes: Dict[int, Tuple[vs.Environment, Dict[Tuple, vs.VideoNode]]] = {}
+
+
+def source(path: Union[Path, str], /, indexer: str = 'lsmas', cache_dir: Union[Path, str] = None,
+           **kwargs) -> vs.VideoNode:
+    """
+    Opens a video file, reusing its index from earlier scripts.
+
+    Index files are named after the file's absolute path, size and modification time,
+    so a source is only indexed again once it changes (older indexes of it are removed then).
+    Opening the same source again in the same environment (core) returns the same clip without touching the index.
+
+    :param path: `'/path/to/video.mkv'`
+
+    :param indexer: 'lsmas' (LWLibavSource) or 'ffms2' (Default value = 'lsmas')
+
+    :param cache_dir: folder for index files (Default value = None)
+        None uses $VSSOURCE_CACHE or ~/.cache/vssource.
+
+    :param kwargs: passed on to the source filter, i.e. `fpsnum`, `track`
+
+    :returns: clip
+    """
+    if indexer not in _INDEXERS:
+        raise ValueError('source: indexer must be \'lsmas\' or \'ffms2\'')
+    path = Path(path).resolve()
+    try: stat = path.stat()
+    except FileNotFoundError: raise ValueError(f'source: {path} not found') from None
+
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    node_key = (key, indexer, repr(sorted(kwargs.items())))
+    nodes = _session_nodes()
+    if node_key in nodes:
+        return nodes[node_key]
+
+    cachefile = _cachefile(key, indexer, cache_dir or CACHE_DIR)
+    if indexer == 'lsmas':
+        clip = core.lsmas.LWLibavSource(str(path), cachefile=cachefile, **kwargs)
+    else:
+        clip = core.ffms2.Source(str(path), cachefile=cachefile, **kwargs)
+
+    nodes[node_key] = clip
+    return clip
+
+
+def _session_nodes() -> Dict[Tuple, vs.VideoNode]:
+    """Returns the clips opened in the current environment, forgetting those of environments that were freed."""
+    for env_id in [i for i, (env, _) in _nodes.items() if not env.alive]:
+        del _nodes[env_id]
+
+    env = vs.get_current_environment()
+    return _nodes.setdefault(env.env_id, (env, {}))[1]
+
+
+def _cachefile(key: Tuple[str, int, int], indexer: str, cache_dir: Union[Path, str]) -> str:
+    """Returns the index file for `key`, removing indexes of earlier versions of the same file."""
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix = sha1(key[0].encode()).hexdigest()[:16]
+    name = f'{prefix}-{key[1]}-{key[2]}{_INDEXERS[indexer]}'
+
+    for old in Path(cache_dir).glob(f'{prefix}-*{_INDEXERS[indexer]}'):
+        if old.name != name:
+            try: old.unlink()
+            except OSError: pass
+
+    return os.path.join(cache_dir, name)
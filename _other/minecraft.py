@@ -1,4 +1,6 @@
+import heapq
 import math
+from array import array
 
 # Speeds
 sprinting = 5.6
@@ -9,6 +11,8 @@ boat_blue_ice = 70.0
 
 
 class Coord:
+    __slots__ = ('x', 'y', 'z', 'dim')
+
     def __init__(self, *args, dim: int = 0):
         if len(args) == 2:
             self.x = args[0]
@@ -52,6 +56,172 @@ class Coord:
             print(f'Located at ({self.x}, {y}, {self.z}) in the End.')
 
 
+class Coords:
+    """Compact collection of coordinates in one dimension, stored in arrays instead of one Coord per point."""
+    __slots__ = ('x', 'y', 'z', 'dim', '_grid', '_cell', '_auto', '_bounds')
+
+    def __init__(self, coords=(), dim: int = 0, cell: int = None):
+        if dim not in [-1, 0, 1]:
+            raise ValueError('dim must be either -1 (nether), 0 (overworld), or 1 (end)')
+        self.dim = dim
+        # points without a y value store NaN
+        self.x, self.y, self.z = array('d'), array('d'), array('d')
+        self._grid, self._cell, self._auto = None, cell, cell is None
+        for c in coords:
+            self.append(c)
+
+    @classmethod
+    def _from_arrays(cls, x, y, z, dim: int):
+        new = cls(dim=dim)
+        new.x, new.y, new.z = array('d', x), array('d', y), array('d', z)
+        return new
+
+    def append(self, c: Coord):
+        if c.dim != self.dim:
+            raise ValueError('Coords can only hold coordinates from one dimension!')
+        self.x.append(c.x)
+        self.y.append(math.nan if c.y is None else c.y)
+        self.z.append(c.z)
+        self._grid = None
+        if self._auto:
+            self._cell = None
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, i: int):
+        x, y, z = self.x[i], self.y[i], self.z[i]
+        x, z = int(x) if x.is_integer() else x, int(z) if z.is_integer() else z
+        if math.isnan(y):
+            return Coord(x, z, dim=self.dim)
+        return Coord(x, int(y) if y.is_integer() else y, z, dim=self.dim)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def nether(self):
+        if self.dim == 0:
+            nan = [math.nan] * len(self)
+            return Coords._from_arrays([math.floor(x / 8) for x in self.x], nan, [math.floor(z / 8) for z in self.z], -1)
+        else:
+            return self
+
+    def overworld(self):
+        if self.dim == -1:
+            nan = [math.nan] * len(self)
+            return Coords._from_arrays([int(x * 8) for x in self.x], nan, [int(z * 8) for z in self.z], 0)
+        else:
+            return self
+
+    def _pairs(self, b):
+        """yields (dx, dy, dz) to `b` for every point, dy is NaN when either point has no y"""
+        if b.dim != self.dim:
+            raise ValueError('Distance calculation requires both coordinates to be in the same dimension!')
+        if isinstance(b, Coord):
+            by = math.nan if b.y is None else b.y
+            return ((x - b.x, y - by, z - b.z) for x, y, z in zip(self.x, self.y, self.z))
+        if len(b) != len(self):
+            raise ValueError('Pairwise distances require the same amount of coordinates!')
+        return ((x - bx, y - by, z - bz) for x, y, z, bx, by, bz in zip(self.x, self.y, self.z, b.x, b.y, b.z))
+
+    def taxi(self, b):
+        """taxicab distances from every point to the Coord `b`, or to the matching point of the Coords `b`"""
+        return array('d', (abs(dx) + abs(dz) + (0 if dy != dy else abs(dy)) for dx, dy, dz in self._pairs(b)))
+
+    def dist(self, b):
+        """distances from every point to the Coord `b`, or to the matching point of the Coords `b`"""
+        return array('d', (math.sqrt(dx * dx + dz * dz + (0 if dy != dy else dy * dy)) for dx, dy, dz in self._pairs(b)))
+
+    def _index(self):
+        # buckets of point indices by (x, z) cell, rebuilt after appending
+        if self._grid is None:
+            self._grid = {}
+            if self._cell is None and len(self):
+                # about 2 points per cell when they're spread out evenly
+                side = max(max(self.x) - min(self.x), max(self.z) - min(self.z))
+                self._cell = max(16, math.ceil(side / math.sqrt(len(self) / 2)))
+            for i, (x, z) in enumerate(zip(self.x, self.z)):
+                self._grid.setdefault((math.floor(x / self._cell), math.floor(z / self._cell)), []).append(i)
+            if self._grid:
+                self._bounds = (min(gx for gx, _ in self._grid), max(gx for gx, _ in self._grid),
+                                min(gz for _, gz in self._grid), max(gz for _, gz in self._grid))
+        return self._grid
+
+    def _ring(self, cx: int, cz: int, r: int):
+        """yields the point indices in the square ring of cells `r` cells around (cx, cz)"""
+        grid = self._index()
+        x0, x1, z0, z1 = self._bounds
+        for gx in range(max(cx - r, x0), min(cx + r, x1) + 1):
+            if abs(gx - cx) == r:
+                cells = range(max(cz - r, z0), min(cz + r, z1) + 1)
+            else:
+                cells = [gz for gz in {cz - r, cz + r} if z0 <= gz <= z1]
+            for gz in cells:
+                yield from grid.get((gx, gz), ())
+
+    def nearest(self, c: Coord, k: int = 1):
+        """returns [(distance, index), ...] of the `k` closest points to `c`, searching the grid outwards from `c`"""
+        if c.dim != self.dim:
+            raise ValueError('Distance calculation requires both coordinates to be in the same dimension!')
+        grid = self._index()
+        if not grid or k < 1:
+            return []
+        cx, cz = math.floor(c.x / self._cell), math.floor(c.z / self._cell)
+        # only rings crossing the cells that have points in them need to be searched
+        x0, x1, z0, z1 = self._bounds
+        first = max(x0 - cx, cx - x1, z0 - cz, cz - z1, 0)
+        last = max(cx - x0, x1 - cx, cz - z0, z1 - cz, 0)
+        cy = math.nan if c.y is None else c.y
+
+        best = []  # max-heap of (-distance, -index)
+        for r in range(first, last + 1):
+            # every point in ring r is at least (r - 1) cells away horizontally
+            if len(best) == k and (r - 1) * self._cell > -best[0][0]:
+                break
+            for i in self._ring(cx, cz, r):
+                dx, dy, dz = self.x[i] - c.x, self.y[i] - cy, self.z[i] - c.z
+                d = math.sqrt(dx * dx + dz * dz + (0 if dy != dy else dy * dy))
+                if len(best) < k:
+                    heapq.heappush(best, (-d, -i))
+                elif (-d, -i) > best[0]:
+                    heapq.heapreplace(best, (-d, -i))
+
+        return sorted((-d, -i) for d, i in best)
+
+    def within(self, c: Coord, radius: float):
+        """returns the indices of every point at most `radius` blocks from `c`"""
+        if c.dim != self.dim:
+            raise ValueError('Distance calculation requires both coordinates to be in the same dimension!')
+        if not self._index():
+            return []
+        cx, cz = math.floor(c.x / self._cell), math.floor(c.z / self._cell)
+        reach = math.ceil(radius / self._cell)
+        cy = math.nan if c.y is None else c.y
+
+        found = []
+        for r in range(reach + 1):
+            for i in self._ring(cx, cz, r):
+                dx, dy, dz = self.x[i] - c.x, self.y[i] - cy, self.z[i] - c.z
+                if dx * dx + dz * dz + (0 if dy != dy else dy * dy) <= radius * radius:
+                    found.append(i)
+        return sorted(found)
+
+    def box(self, c: Coord, radius: int):
+        """returns the indices of every point at most `radius` blocks from `c` along x and along z, at any height"""
+        if c.dim != self.dim:
+            raise ValueError('Distance calculation requires both coordinates to be in the same dimension!')
+        if not self._index():
+            return []
+        cx, cz = math.floor(c.x / self._cell), math.floor(c.z / self._cell)
+
+        found = []
+        for r in range(math.ceil(radius / self._cell) + 1):
+            for i in self._ring(cx, cz, r):
+                if abs(self.x[i] - c.x) <= radius and abs(self.z[i] - c.z) <= radius:
+                    found.append(i)
+        return sorted(found)
+
+
 def taxi(a: Coord, b: Coord):
     if a.dim != b.dim:
         raise ValueError('Taxicab distance calculation requires both coordinates to be in the same dimension!')
@@ -109,3 +279,149 @@ def travel(from_: Coord, to_: Coord):
 
     print(f'From ({from_.x}, {from_.z}) towards ({to_.x}, {to_.z}), you must travel {abs(int(x_diff))} blocks {direction_x} and {abs(int(z_diff))} blocks {direction_z}.')
     # print(f'Exact angle is {dir_vector:.1f}°.')
+
+
+# Seconds spent standing in a nether portal before being teleported
+portal_time = 4.0
+
+# Blocks searched around the destination for an existing portal, along x and z
+portal_search_overworld = 128
+portal_search_nether = 16
+
+modes = {sprinting: 'sprinting', minecart: 'minecart', minecart_diag: 'minecart (diagonal)',
+         boat_ice: 'boat (ice)', boat_blue_ice: 'boat (blue ice)'}
+
+
+class Routes:
+    """
+    Fastest routes between named places, going through nether portals and along faster tracks.
+
+    Places in the same dimension can always be sprinted between, tracks (rails, ice roads) are added with their speed
+    and portals link an overworld and a nether place. Shortest-path trees are cached per starting place,
+    so routes from one place to many destinations only search once until the routes change.
+    """
+
+    def __init__(self):
+        self.places = {}
+        self._tracks = {}
+        self._trees = {}
+
+    def add_place(self, name: str, c: Coord):
+        self.places[name] = c
+        self._tracks.setdefault(name, {})
+        self._trees.clear()
+
+    def add_portal(self, name: str, overworld: Coord, nether: Coord = None):
+        """adds the places `name (Overworld)` and `name (Nether)`, the nether side defaults to the matching location"""
+        if overworld.dim != 0 or (nether is not None and nether.dim != -1):
+            raise ValueError('Portals link an overworld and a nether coordinate!')
+        a, b = f'{name} (Overworld)', f'{name} (Nether)'
+        self.add_place(a, overworld)
+        self.add_place(b, overworld.nether() if nether is None else nether)
+        self._link(a, b, portal_time, 'portal')
+
+    def add_track(self, a: str, b: str, speed: float = minecart, mode: str = None):
+        """adds a track both ways between two places in the same dimension, i.e. a rail line or a blue ice road"""
+        if self.places[a].dim != self.places[b].dim:
+            raise ValueError('Distance calculation requires both coordinates to be in the same dimension!')
+        self._link(a, b, time(dist(self.places[a], self.places[b]), speed), mode or modes.get(speed, f'{speed} m/s'))
+
+    def _link(self, a: str, b: str, seconds: float, mode: str):
+        # only the fastest way between two places is kept
+        for x, y in ((a, b), (b, a)):
+            if y not in self._tracks[x] or seconds < self._tracks[x][y][0]:
+                self._tracks[x][y] = (seconds, mode)
+        self._trees.clear()
+
+    def _edges(self, a: str):
+        here = self.places[a]
+        for b, c in self.places.items():
+            if b != a and c.dim == here.dim:
+                yield b, time(dist(here, c), sprinting), 'sprinting'
+        for b, (seconds, mode) in self._tracks[a].items():
+            yield b, seconds, mode
+
+    def tree(self, start: str):
+        """returns {place: (seconds, previous place, mode)} of the fastest routes from `start` to every reachable place"""
+        if start not in self._trees:
+            if start not in self.places:
+                raise ValueError(f'Unknown place: {start}')
+            tree, done, heap = {start: (0.0, None, None)}, set(), [(0.0, start)]
+            while heap:
+                seconds, a = heapq.heappop(heap)
+                if a in done:
+                    continue
+                done.add(a)
+                for b, cost, mode in self._edges(a):
+                    if b not in done and (b not in tree or seconds + cost < tree[b][0]):
+                        tree[b] = (seconds + cost, a, mode)
+                        heapq.heappush(heap, (seconds + cost, b))
+            self._trees[start] = tree
+        return self._trees[start]
+
+    def route(self, start: str, end: str):
+        """returns (ETA in seconds, [(from, to, mode, seconds), ...]) of the fastest route"""
+        tree = self.tree(start)
+        if end not in tree:
+            raise ValueError(f'No route from {start} to {end}!')
+        legs, b = [], end
+        while b != start:
+            seconds, a, mode = tree[b]
+            legs.append((a, b, mode, seconds - tree[a][0]))
+            b = a
+        return tree[end][0], legs[::-1]
+
+    def plan(self, start: str, end: str):
+        eta, legs = self.route(start, end)
+        for a, b, mode, seconds in legs:
+            print(f'{a} --> {b}: {mode} for {seconds:.0f} s')
+        print(f'From {start} to {end} takes {eta // 60:.0f} min {eta % 60:.0f} s.')
+
+
+def portal_links(overworld: dict, nether: dict):
+    """
+    Finds the portal every portal links to, as {'overworld': {name: nether name}, 'nether': {name: overworld name}}.
+
+    Like the game, the destination is the matching coordinate in the other dimension and the closest portal within
+    `portal_search_overworld` / `portal_search_nether` blocks of it (along x and z) is used.
+    None means no portal is in range, so going through creates a new portal.
+
+    :param overworld: {name: Coord} of the overworld portals
+    :param nether: {name: Coord} of the nether portals
+    """
+    links = {}
+    for side, portals, targets, radius in (('overworld', overworld, nether, portal_search_nether),
+                                           ('nether', nether, overworld, portal_search_overworld)):
+        names = list(targets)
+        index = Coords(targets.values(), dim=0 if side == 'nether' else -1, cell=radius)
+
+        links[side] = {}
+        for name, c in portals.items():
+            dest = c.overworld() if side == 'nether' else c.nether()
+            if c.y is not None:
+                dest = Coord(dest.x, c.y, dest.z, dim=dest.dim)
+            found = [(dist(dest, index[i]), i) for i in index.box(dest, radius)]
+            links[side][name] = names[min(found)[1]] if found else None
+
+    return links
+
+
+def check_portals(overworld: dict, nether: dict):
+    """
+    Prints and returns every portal that doesn't link back and forth with one portal in the other dimension.
+
+    :returns: [(dimension, name, problem), ...]
+    """
+    links = portal_links(overworld, nether)
+    problems = []
+    for side, other in (('overworld', 'nether'), ('nether', 'overworld')):
+        for name, target in links[side].items():
+            if target is None:
+                problems.append((side, name, f'links to nothing, a new {other} portal will be made'))
+            elif links[other][target] != name:
+                problems.append((side, name, f'links to {target} ({other}), which links back to '
+                                             f'{links[other][target] or "a new portal"}'))
+
+    for side, name, problem in problems:
+        print(f'{name} ({side}) {problem}')
+    return problems
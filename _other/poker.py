@@ -2,7 +2,9 @@
 __author__ = 'Dave <orangechannel@pm.me>'
 __date__ = '4 February 2020'
 
-from itertools import product
+from fractions import Fraction
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
 
 # Constants:
 CASE = 100
@@ -27,7 +29,8 @@ amounts = {'yellow': 2 * CASE,
            }
 
 
-def combo_finder(starting_stack: int, players: int = 9, min_chip: int = 25, colors: bool = True, ret_list: bool = False):
+def combo_finder(starting_stack: int, players: int = 9, min_chip: int = 25, colors: bool = True, ret_list: bool = False,
+                 rank: str = None):
     """
     Prints possible combinations of poker chips that sum to `amount` using the amounts and money dicts.
 
@@ -40,8 +43,106 @@ def combo_finder(starting_stack: int, players: int = 9, min_chip: int = 25, colo
     :param colors: fancier print messages with colors instead of $ values (Default value = True)
 
     :param ret_list: return the list of combinations instead of printing
+
+    :param rank: orders the combinations, see `rank_combos` (Default value = None)
+        None keeps them in order of chip counts, smallest chip values changing fastest.
     """
     combos = []
+
+    found = combo_generator(starting_stack, players, min_chip)
+    if rank:
+        found = rank_combos(found, rank)
+
+    for combo in found:
+        if ret_list:
+            combos.append(["{:02d} x ${}".format(amt, money[name]) for name, amt in combo.items()])
+        else:
+            if colors:
+                print(["{:02d} {} chips".format(amt, name) for name, amt in combo.items()])
+            else:
+                print(["{:02d} x ${}".format(amt, money[name]) for name, amt in combo.items()])
+    if ret_list:
+        return combos
+
+
+def combo_generator(starting_stack: int, players: int = 9, min_chip: int = 25) -> Iterator[Dict[str, int]]:
+    """
+    Lazily yields the combinations of poker chips that sum to `starting_stack` as {color: count} dicts.
+
+    Only walks partial stacks that can still be completed with the remaining chips, found with a
+    bounded knapsack of the reachable sums, instead of trying every combination of chip counts.
+
+    :param starting_stack: desired starting stack value ($)
+
+    :param players: expected amount of players to determine max amount of each chip (Default value = 9)
+
+    :param min_chip: smallest value ($) chip in starting stack (Default value = 25)
+    """
+    maxes = _chip_maxes(starting_stack, players, min_chip)
+    names = list(money.keys())
+    values = [money[name] for name in names]
+    counts = [maxes[name] for name in names]
+
+    reachable = _reachable(values, counts, starting_stack)
+    combo = [0] * len(names)
+
+    def _walk(i: int, remaining: int):
+        if i == len(names):
+            yield dict(zip(names, combo))
+            return
+
+        for count in range(min(counts[i], remaining // values[i]) + 1):
+            rest = remaining - count * values[i]
+            if reachable[i + 1] >> rest & 1:
+                combo[i] = count
+                yield from _walk(i + 1, rest)
+        combo[i] = 0
+
+    if reachable[0] >> starting_stack & 1:
+        yield from _walk(0, starting_stack)
+
+
+def rank_combos(combos: Iterable[Dict[str, int]], by: str = 'chips') -> List[Dict[str, int]]:
+    """
+    Sorts chip combinations.
+
+    :param combos: {color: count} dicts from `combo_generator`
+
+    :param by: 'chips' for the fewest chips first,
+        'distribution' for the most colors first, then the smallest pile of any one color (Default value = 'chips')
+    """
+    if by == 'chips':
+        return sorted(combos, key=lambda combo: sum(combo.values()))
+    elif by == 'distribution':
+        return sorted(combos, key=lambda combo: (-sum(1 for i in combo.values() if i), max(combo.values())))
+
+    raise ValueError('rank_combos: `by` must be \'chips\' or \'distribution\'')
+
+
+def combo_benchmark(stacks: Iterable[int] = (1000, 2500, 5000, 10000, 25000, 50000, 100000), players: int = 9,
+                    min_chip: int = 25) -> Dict[int, Tuple[int, float]]:
+    """
+    Times finding every chip combination for each starting stack.
+
+    :param stacks: starting stacks ($) to time
+
+    :param players: expected amount of players (Default value = 9)
+
+    :param min_chip: smallest value ($) chip in starting stack (Default value = 25)
+
+    :returns: {starting_stack: (combinations, seconds)}
+    """
+    results = {}
+    for stack in stacks:
+        start = perf_counter()
+        found = sum(1 for _ in combo_generator(stack, players, min_chip))
+        results[stack] = found, perf_counter() - start
+        print('{:>7}: {:>10,} combinations in {:.3f} s'.format(stack, *results[stack]))
+
+    return results
+
+
+def _chip_maxes(starting_stack: int, players: int, min_chip: int) -> Dict[str, int]:
     # find max chip counts: if chip value is >= the min, include it
     maxes = {k: amounts[k] // players if money[k] >= min_chip else 0 for k in money}
 
@@ -50,33 +151,159 @@ def combo_finder(starting_stack: int, players: int = 9, min_chip: int = 25, colo
         if money[i] >= starting_stack:
             maxes[i] = 0
 
-    # optimize maxes: if chip value * max > starting stack, lower the max by 1
+    # optimize maxes: the most of a chip that fits in the starting stack
     # i.e. maxes['purple'] = 22, starting_stack = 900 --> maxes['purple'] = 1
     for i in maxes:
-        if maxes[i]:
-            while maxes[i] * money[i] > starting_stack:
-                maxes[i] -= 1
-
-    # for i in maxes
-    maxes_list = [maxes[i] + 1 for i in maxes.keys()]
-    product_list = [range(i) for i in maxes_list]  # range(x), range(y) ... for product arguments
-
-    for pairs in product(*product_list):
-        total = sum([pairs[k] * v for k, v in enumerate(money.values())])
-        if total == starting_stack:
-            if ret_list:
-                combos.append(["{:02d} x ${}".format(amt, val) for amt, val in
-                               [(pairs[k], v) for k, v in enumerate(money.values())]])
-            else:
-                if colors:
-                    # first we get the amount in `pairs` and the name from money's keys before formatting and printing
-                    print(["{:02d} {} chips".format(amt, name) for amt, name in
-                           [(pairs[k], v) for k, v in enumerate(money.keys())]])
-                else:
-                    print(["{:02d} x ${}".format(amt, val) for amt, val in
-                           [(pairs[k], v) for k, v in enumerate(money.values())]])
-    if ret_list:
-        return combos
+        maxes[i] = min(maxes[i], starting_stack // money[i])
+
+    return maxes
+
+
+def _allocations(values: List[int], caps: List[int], limit: int, color_up: bool, rank: str) -> List[dict]:
+    """
+    Bounded knapsack over the value of the chips so far, smallest chip first.
+
+    The chips below a color are exactly the value before it, so the color up reserve is known when counting it.
+    Returns a layer for every color: {value: (rank key, previous value, count)} of the best breakdown making `value`.
+    """
+    if rank not in ('chips', 'distribution'):
+        raise ValueError('allocate_chips: `rank` must be \'chips\' or \'distribution\'')
+
+    layers = [{0: ((0, 0), None, 0)}]
+    for value, cap in zip(values, caps):
+        layer = {}
+        for below, (key, _, _) in sorted(layers[-1].items()):
+            # every player needs this many extra chips of this color to color up the smaller chips
+            extra = -(-below // value) if color_up else 0
+            for count in range(min(cap - extra, (limit - below) // value) + 1):
+                # fewest chips, or the most colors and then the smallest pile of any one color
+                new = (key[0] + count, 0) if rank == 'chips' else (key[0] - (count > 0), max(key[1], count))
+                total = below + count * value
+                if total not in layer or new < layer[total][0]:
+                    layer[total] = (new, below, count)
+        layers.append(layer)
+
+    return layers
+
+
+def _reachable(values: List[int], counts: List[int], limit: int) -> List[int]:
+    """Returns bitsets of the sums up to `limit` that chips i.. can make, for every i (with one more for no chips)."""
+    mask = (1 << (limit + 1)) - 1
+    reachable = [0] * len(values) + [1]
+
+    for i in range(len(values) - 1, -1, -1):
+        bits, count, take = reachable[i + 1], counts[i], 1
+        # adding 1, 2, 4, ... chips at a time (then the rest) covers every count up to the max
+        while count > 0:
+            take = min(take, count)
+            bits |= (bits << (take * values[i])) & mask
+            count -= take
+            take <<= 1
+        reachable[i] = bits
+
+    return reachable
+
+
+def allocate_chips(players: int, inventory: Dict[str, int] = None, min_chip: int = 25, max_stack: int = None,
+                   step: int = 100, color_up: bool = True, rank: str = 'distribution') -> dict:
+    """
+    Finds the biggest uniform starting stack the whole chip inventory can cover for every player.
+
+    With `color_up`, enough chips of every color are held back to color up all smaller chips into it,
+    e.g. 10 players starting with 8 x $25 need 10 * 2 extra $100 chips to color the $25 chips up.
+
+    :param players: total amount of players over all tables
+
+    :param inventory: {color: count} of all chips (Default value = None)
+        None uses `amounts`.
+
+    :param min_chip: smallest value ($) chip in starting stack (Default value = 25)
+
+    :param max_stack: biggest starting stack ($) to consider (Default value = None)
+        None allows using up the whole inventory.
+
+    :param step: starting stack must be a multiple of this ($) (Default value = 100)
+
+    :param color_up: keeps a reserve for coloring up (Default value = True)
+
+    :param rank: picks the breakdown when the stack has more than one, see `rank_combos` (Default value = 'distribution')
+
+    :returns: {'stack': starting stack ($), 'per_player': {color: count}, 'used': {color: count}, 'reserve': {color: count}}
+    """
+    inventory = amounts if inventory is None else inventory
+    names = sorted((name for name in money if money[name] >= min_chip), key=money.get)
+    values = [money[name] for name in names]
+    caps = [inventory.get(name, 0) // players for name in names]
+
+    limit = sum(v * c for v, c in zip(values, caps))
+    if max_stack is not None:
+        limit = min(limit, max_stack)
+
+    best = _allocations(values, caps, limit, color_up, rank)
+    stack = max((i for i in best[-1] if i and not i % step), default=None)
+    if stack is None:
+        raise ValueError('allocate_chips: inventory can\'t cover {} players'.format(players))
+
+    # walk back from the biggest chip to the counts that made the best breakdown
+    counts, value = [], stack
+    for layer in reversed(best[1:]):
+        _, value, count = layer[value]
+        counts.append(count)
+
+    per_player = {name: 0 for name in money}
+    per_player.update(zip(names, reversed(counts)))
+
+    used = {name: amt * players for name, amt in per_player.items()}
+    reserve = {name: inventory.get(name, 0) - used[name] for name in money}
+
+    return {'stack': stack, 'per_player': per_player, 'used': used, 'reserve': reserve}
+
+
+def blind_structure(per_player: Dict[str, int], levels: int = 15, small_blind: int = None, growth: float = 1.5) -> List[dict]:
+    """
+    Suggests blinds and when to color up each chip for a starting stack.
+
+    Blinds are kept to multiples of the smallest chip still in play. Once the small blind reaches
+    the next chip's value, the smallest chip isn't needed anymore and is colored up.
+
+    :param per_player: {color: count} starting stack, i.e. `allocate_chips(...)['per_player']`
+
+    :param levels: amount of blind levels (Default value = 15)
+
+    :param small_blind: first small blind ($) (Default value = None)
+        None starts at 100 big blinds deep.
+
+    :param growth: how much the blinds go up per level (Default value = 1.5)
+
+    :returns: [{'level': 1, 'small_blind': 50, 'big_blind': 100, 'color_up': []}, ...]
+        `color_up` are the colors to remove at the start of that level.
+    """
+    in_play = sorted((name for name, amt in per_player.items() if amt), key=money.get)
+    if not in_play:
+        raise ValueError('blind_structure: starting stack has no chips')
+    if growth <= 1:
+        raise ValueError('blind_structure: growth must be more than 1')
+
+    stack = sum(money[name] * amt for name, amt in per_player.items())
+    unit = money[in_play[0]]
+    if small_blind is None:
+        small_blind = max(unit, stack // 200 // unit * unit)
+    elif small_blind % unit:
+        raise ValueError('blind_structure: small blind must be a multiple of the smallest chip')
+
+    structure = [{'level': 1, 'small_blind': small_blind, 'big_blind': 2 * small_blind, 'color_up': []}]
+    for level in range(2, levels + 1):
+        target = small_blind * growth
+
+        colored = []
+        while len(in_play) > 1 and target >= money[in_play[1]]:
+            colored.append(in_play.pop(0))
+        unit = money[in_play[0]]
+
+        small_blind = max((small_blind // unit + 1) * unit, round(target / unit) * unit)
+        structure.append({'level': level, 'small_blind': small_blind, 'big_blind': 2 * small_blind, 'color_up': colored})
+
+    return structure
 
 
 def prize_calculator(buy_in: int, players: int, entrance_fee: float = None, winners: int = None,
@@ -86,31 +313,16 @@ def prize_calculator(buy_in: int, players: int, entrance_fee: float = None, winn
 
     # Entrance Fee Calculator
     if entrance_fee is None:
-        if buy_in < 10:
-            entrance_fee = 0.25
-        elif buy_in < 25:
-            entrance_fee = 0.50
-        elif buy_in < 50:
-            entrance_fee = 1.00
-        elif buy_in < 100:
-            entrance_fee = 2.00
-        else:
-            entrance_fee = 3.00
+        entrance_fee = _entrance_fee(buy_in)
 
     # Winners Calculator
     if winners is None:
-        if players == 10:
-            winners = 4
-        elif 8 <= players <= 9:
-            winners = 3
-        elif players > 4:
-            winners = 2
-        else:
-            winners = 1
+        winners = _winners(players)
 
     worth = buy_in - entrance_fee
 
-    if winners == 4:
+    # the hardcoded splits add up to players * worth only for these field sizes
+    if winners == 4 and players == 10:
         prizes.append(worth / 2)  # 1/20 = 5 %
         prizes.append(3 * worth / 2)  # 3/20 = 15 %
         prizes.append(5 * worth / 2)  # 5/20 = 25 %
@@ -137,9 +349,13 @@ def prize_calculator(buy_in: int, players: int, entrance_fee: float = None, winn
             prizes.append(3 * worth / 2)
             prizes.append(7 * worth / 2)
 
-    else:
+    elif winners == 1:
         prizes.append(players * worth)
 
+    # any other field size or amount of winners
+    if not prizes:
+        prizes = [float(i) for i in payouts(players * worth, winners, round_to=0.01)][::-1]
+
     for k, v in enumerate(prizes[::-1]):
         print('Prize {}: ${:.2f}'.format(k + 1, v))
 
@@ -150,6 +366,113 @@ def prize_calculator(buy_in: int, players: int, entrance_fee: float = None, winn
         return int(worth * chips_per_dollar)
 
 
+def payouts(pool: Union[int, float, Fraction], winners: int, curve: str = 'geometric', ratio: float = None,
+            round_to: Union[int, float, Fraction] = 1) -> List[Fraction]:
+    """
+    Splits a prize pool between any amount of winners, first place first.
+
+    Every prize is a multiple of `round_to` and the prizes add up to exactly `pool`: each prize is rounded down and
+    the units left over go to the places that lost the most by rounding (first places first on ties).
+    Whatever can't be split in `round_to` units goes to first place.
+
+    :param pool: total prize money ($)
+
+    :param winners: amount of paid places
+
+    :param curve: 'geometric' for each place getting `ratio` times the place above,
+        'power' for place n getting 1 / n ** `ratio` of first place, a flatter top heavy curve (Default value = 'geometric')
+
+    :param ratio: steepness of the curve (Default value = None)
+        None uses 0.5 for 'geometric' and 1 for 'power'.
+
+    :param round_to: smallest prize unit ($), i.e. the smallest chip or bill paid out (Default value = 1)
+    """
+    if winners < 1:
+        raise ValueError('payouts: there must be at least one winner')
+    if curve == 'geometric':
+        ratio = Fraction(str(0.5 if ratio is None else ratio))
+        weights = [ratio ** i for i in range(winners)]
+    elif curve == 'power':
+        ratio = 1 if ratio is None else ratio
+        weights = [Fraction(str(1 / n ** ratio)) for n in range(1, winners + 1)]
+    else:
+        raise ValueError('payouts: curve must be \'geometric\' or \'power\'')
+
+    pool, unit = Fraction(str(pool)), Fraction(str(round_to))
+    shares = [pool * w / sum(weights) for w in weights]
+
+    prizes = [share // unit * unit for share in shares]
+    left = int((pool - sum(prizes)) // unit)
+    for i in sorted(range(winners), key=lambda i: (prizes[i] - shares[i], i))[:left]:
+        prizes[i] += unit
+    prizes[0] += pool - sum(prizes)
+
+    return prizes
+
+
+def payout_sheet(buy_ins: Iterable[int], field_sizes: Iterable[int], curve: str = 'geometric', ratio: float = None,
+                 round_to: Union[int, float, Fraction] = 1, entrance_fee: float = None,
+                 ret: bool = False) -> Dict[Tuple[int, int], List[Fraction]]:
+    """
+    Prints the prizes of every buy-in and field size, i.e. for a venue's payout sheet.
+
+    :param buy_ins: buy-ins ($) to tabulate
+
+    :param field_sizes: amounts of players to tabulate, winners are found the same way as `prize_calculator`
+
+    :param curve: see `payouts` (Default value = 'geometric')
+
+    :param ratio: see `payouts` (Default value = None)
+
+    :param round_to: smallest prize unit ($) (Default value = 1)
+
+    :param entrance_fee: fee ($) taken from every buy-in (Default value = None)
+        None uses the same fees as `prize_calculator`.
+
+    :param ret: return {(buy_in, players): prizes} instead of printing
+    """
+    sheet = {}
+    field_sizes = list(field_sizes)
+    for buy_in in buy_ins:
+        fee = _entrance_fee(buy_in) if entrance_fee is None else entrance_fee
+        for players in field_sizes:
+            sheet[buy_in, players] = payouts((buy_in - Fraction(str(fee))) * players, _winners(players), curve, ratio,
+                                             round_to)
+
+    if ret:
+        return sheet
+
+    for (buy_in, players), prizes in sheet.items():
+        print('${:<6} {:>3} players: {}'.format(buy_in, players, '  '.join('${:.2f}'.format(float(i)) for i in prizes)))
+
+
+def _entrance_fee(buy_in: float) -> float:
+    if buy_in < 10:
+        return 0.25
+    elif buy_in < 25:
+        return 0.50
+    elif buy_in < 50:
+        return 1.00
+    elif buy_in < 100:
+        return 2.00
+    else:
+        return 3.00
+
+
+def _winners(players: int) -> int:
+    if players > 10:
+        # about the top 15 % are paid in bigger fields
+        return max(4, round(players * 0.15))
+    elif players == 10:
+        return 4
+    elif 8 <= players <= 9:
+        return 3
+    elif players > 4:
+        return 2
+    else:
+        return 1
+
+
 def tournament():
     # Players
     players = int(input('How many players: '))
@@ -1,4 +1,5 @@
 import itertools
+import math
 import random
 from fractions import Fraction
 import functools
@@ -50,6 +51,165 @@ def run(refinement_levels: list, specific: bool=False):
     return rewards
 
 
+# exact chances of each loot per refinement level: {(refinement, specific): [common, uncommon, rare]}
+_probabilities = {(ref, sub): (sub_rarities if sub else rarities)[ref] for ref in range(4) for sub in (False, True)}
+
+
+def distribution(refinement_levels: list, rarity: int, specific: bool=False):
+    """
+    returns the exact chances of the squad getting the goal loot exactly 0, 1, ..., n times in one run
+
+    each relic adds one hit chance, so this takes n² steps instead of going through all 2^n outcomes
+    """
+    return list(_distribution(tuple(sorted(refinement_levels)), rarity, specific))
+
+
+@functools.lru_cache(maxsize=None)
+def _distribution(refinement_levels: tuple, rarity: int, specific: bool):
+    """cached `distribution` of a sorted squad, built on the cached squad without its last relic"""
+    if not refinement_levels:
+        return (Fraction(1),)
+    dist = list(_distribution(refinement_levels[:-1], rarity, specific))
+    p = _probabilities[refinement_levels[-1], specific][rarity]
+    return tuple(a * (1 - p) + b * p for a, b in zip(dist + [0], [0] + dist))
+
+
+def odds(refinement_levels: list, rarity: int, specific: bool=False):
+    """
+    returns the numbers `auto` prints as a dict, without asking for input
+
+    chance: chance per run of getting at least one of the goal loot
+    runs: expected number of runs to get it (inf if it can't be received, i.e. with an empty squad)
+    traces: void traces spent per run
+    traces_per_reward: expected void traces spent per goal loot received (counting every copy)
+    exactly: [chance of getting it exactly 0 times, 1 time, ...]
+    """
+    dist = distribution(refinement_levels, rarity, specific)
+    traces = sum(refinement_costs[i] for i in refinement_levels)
+    rewards = sum(_probabilities[ref, specific][rarity] for ref in refinement_levels)
+
+    # an empty squad never gets the goal loot, which would divide by zero
+    if not rewards:
+        return {'refinement_levels': list(refinement_levels), 'chance': 1 - dist[0], 'runs': math.inf,
+                'traces': traces, 'traces_per_reward': math.inf, 'exactly': dist}
+
+    return {'refinement_levels': list(refinement_levels), 'chance': 1 - dist[0], 'runs': 1 / (1 - dist[0]),
+            'traces': traces, 'traces_per_reward': traces / rewards, 'exactly': dist}
+
+
+def sweep(rarity: int, specific: bool=False, player_counts=range(1, 5), by: str='traces_per_reward'):
+    """
+    returns `odds` for every combination of refinement levels and squad size, ranked by `by`
+
+    the order of the relics doesn't matter, so every squad is only tried once
+    by: 'traces_per_reward' for the cheapest loot, then the least runs, or 'runs' for the least runs, then the cheapest
+    """
+    if by not in ('traces_per_reward', 'runs'):
+        raise ValueError("sweep: by must be 'traces_per_reward' or 'runs'")
+    other = 'runs' if by == 'traces_per_reward' else 'traces_per_reward'
+
+    results = [odds(levels, rarity, specific)
+               for n in player_counts for levels in itertools.combinations_with_replacement(range(4), n)]
+    return sorted(results, key=lambda r: (r[by], r[other], len(r['refinement_levels'])))
+
+
+def pareto(player_counts=range(1, 5)):
+    """
+    returns the squads worth running for every goal: {(rarity, specific): [odds, ...]}
+
+    a squad is worth running if no other squad gets the goal loot both for fewer void traces per reward
+    and in fewer runs, they're sorted from the cheapest to the fastest
+    specific is only False for rare loot, as there's only one rare item per relic
+    """
+    front = {}
+    for rarity in range(3):
+        for specific in ((False, True) if rarity != 2 else (False,)):
+            best_runs, front[rarity, specific] = None, []
+            for r in sweep(rarity, specific, player_counts):
+                if best_runs is None or r['runs'] < best_runs:
+                    front[rarity, specific].append(r)
+                    best_runs = r['runs']
+    return front
+
+
+def _chances(refinement_levels: list, rarity: int, specific: bool=False):
+    """returns the chance per run of getting at least one of the goal loot and {amount: chance of getting exactly amount}"""
+    dist = distribution(refinement_levels, rarity, specific)
+    return float(1 - dist[0]), {amount: float(chance) for amount, chance in enumerate(dist) if amount}
+
+
+def _alias_table(weights: list):
+    """builds Vose's alias table, after which every draw takes one random number and one comparison"""
+    n, total = len(weights), sum(weights)
+    scaled = [w * n / total for w in weights]
+    prob, alias = [1.0] * n, list(range(n))
+
+    small = [i for i, w in enumerate(scaled) if w < 1]
+    large = [i for i, w in enumerate(scaled) if w >= 1]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], l
+        scaled[l] -= 1 - scaled[s]
+        (small if scaled[l] < 1 else large).append(l)
+
+    return prob, alias
+
+
+def _alias_sample(table, k: int, rng: random.Random):
+    """draws k outcomes from an alias table"""
+    prob, alias = table
+    n, rand = len(prob), rng.random
+    return [i if rand() < prob[i] else alias[i] for i in (int(rand() * n) for _ in range(k))]
+
+
+def simulate(refinement_levels: list, rarity: int, specific: bool=False, runs: int=1_000_000, seed: int=None):
+    """
+    simulates `runs` squad runs at once, drawing the rewards of all relics of the same refinement level in one batch
+
+    returns {'counts': {amount: runs}, 'runs_until': {runs: times}}
+        counts: how many players got the goal loot in each run
+        runs_until: runs it took to get the goal loot, counted again after every success
+    """
+    rng = random.Random(seed)
+    # the same reward indices as `run`, the specific item is the first of its rarity
+    goal = [0, 3, 5][rarity] if specific else rarity
+
+    found = [0] * runs
+    for ref in set(refinement_levels):
+        r = Relic(ref)
+        weights = [r.scommon] * 3 + [r.suncommon] * 2 + [r.srare] if specific else [r.common, r.uncommon, r.rare]
+        table = _alias_table(weights)
+        for _ in range(refinement_levels.count(ref)):
+            found = [f + (reward == goal) for f, reward in zip(found, _alias_sample(table, runs, rng))]
+
+    counts, runs_until, streak = {}, {}, 0
+    for f in found:
+        counts[f] = counts.get(f, 0) + 1
+        streak += 1
+        if f:
+            runs_until[streak] = runs_until.get(streak, 0) + 1
+            streak = 0
+
+    return {'counts': dict(sorted(counts.items())), 'runs_until': dict(sorted(runs_until.items()))}
+
+
+def compare(refinement_levels: list, rarity: int, specific: bool=False, runs: int=1_000_000, seed: int=None):
+    """prints simulated results next to the exact chances from `auto`"""
+    chance, count_rarity = _chances(refinement_levels, rarity, specific)
+    sim = simulate(refinement_levels, rarity, specific, runs, seed)
+    successes = sum(sim['runs_until'].values())
+
+    print('{:<28}{:>10}{:>11}'.format('', 'exact', 'simulated'))
+    print('{:<28}{:>10.2%}{:>11.2%}'.format('Chance per run', chance, 1 - sim['counts'].get(0, 0) / runs))
+    print('{:<28}{:>10.2f}{:>11.2f}'.format('Number of runs', chance**-1,
+                                            sum(k * v for k, v in sim['runs_until'].items()) / successes if successes else float('inf')))
+    for amount in range(1, len(refinement_levels) + 1):
+        print('{:<28}{:>10.2%}{:>11.2%}'.format('Exactly {} time(s)'.format(amount), count_rarity[amount], sim['counts'].get(amount, 0) / runs))
+    for n in range(1, 11):
+        print('{:<28}{:>10.2%}{:>11.2%}'.format('Got it on run {}'.format(n), (1 - chance)**(n-1) * chance,
+                                                sim['runs_until'].get(n, 0) / successes if successes else 0))
+
+
 def auto():
     start = '\n-->   '
 
@@ -75,52 +235,14 @@ def auto():
     else: specific = False
 
 
-    # chance of getting AT LEAST one
-    p_nots = []
-    for i in range(player_count):
-        p_nots.append(1 - _rarity(refinement_levels[i], specific)[rarity])
+    chance, count_rarity = _chances(refinement_levels, rarity, specific)
 
-    p_not = functools.reduce(lambda x, y: x*y, p_nots)
-
-    print(u'\t\u2605\u2605\u2605  Chance per run of getting {}{} loot: {:.2%}'.format('the specific ' if specific else '',rarity_names[rarity], chance := 1 - p_not))
+    print(u'\t\u2605\u2605\u2605  Chance per run of getting {}{} loot: {:.2%}'.format('the specific ' if specific else '',rarity_names[rarity], chance))
     print(u'\t\u2605\u2605\u2605  Number of runs to get {}{} loot: {:.2f}'.format('the specific ' if specific else '',rarity_names[rarity], runs := chance**-1))
     print(u'\t\u2605\u2605\u2605  Number of void traces to get {}{} loot: {}\n'.format('the specific ' if specific else '',rarity_names[rarity], int(traces * runs)))
     for i in range(player_count):
         print('\t\u2605\u2605  Number of void traces for player # {}: {}'.format(i+1, int(runs*refinement_costs[refinement_levels[i]])))
 
-    # chance of getting an exact number
-
-    # lists of combinations of receiving goal X number of times
-    one, two, three, four = [], [], [], []
-    prod = [i for i in itertools.product([True, False], repeat=player_count)]
-    for i in prod:
-        if i.count(True) == 1:
-            one.append(i)  # [False, True, False, False]
-        elif i.count(True) == 2:
-            two.append(i)
-        elif i.count(True) == 3:
-            three.append(i)
-        elif i.count(True) == 4:
-            four.append(i)  # [True, ...]
-
-    possibilities = [one, two, three, four]
-
-    # probability of EXACTLY 1
-    count_rarity = {}
-    for amount, pos_list in enumerate(possibilities):
-        if pos_list:
-            B = []
-            for combo_list in pos_list:
-                C = []
-                for player_n in range(player_count):
-                    if combo_list[player_n]:
-                        C.append(_rarity(refinement_levels[player_n], specific)[rarity])
-                    else:
-                        C.append(1 - _rarity(refinement_levels[player_n], specific)[rarity])
-                B.append(functools.reduce(lambda x, y: x*y, C))
-
-            count_rarity[amount+1] = sum(B)
-
     print('')
     for i in range(player_count):
         print('\t\u2605  The chance of getting the {}{} loot exactly {} time(s) is {:.2%}'.format('the specific ' if specific else '', rarity_names[rarity], i+1, count_rarity[i+1]))